@@ -0,0 +1,285 @@
+import logging
+import math
+import threading
+import time as _time
+from collections import Counter, OrderedDict
+
+from flask import request, session
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Response
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+
+def parse_limit(limit):
+    """Parses "10/minute" into (tokens per second, burst size)."""
+    count, _, period = limit.partition("/")
+    return int(count) / PERIODS[period], int(count)
+
+
+# ===========================
+# Token Bucket Stores
+# ===========================
+class RateLimitStore:
+    """Backend interface for token buckets shared by all requests using the store."""
+
+    def consume(self, buckets, take=True):
+        """Takes one token from every bucket, or from none if any of them is empty.
+
+        Args:
+            buckets (list[tuple(str, float, int)]): (key, tokens added per second,
+                capacity) per bucket, most specific first.
+            take (bool): False only checks the buckets without taking tokens.
+
+        Returns:
+            tuple(int or None, float): (index of the first empty bucket or None
+            if the tokens were taken, seconds until that bucket has a token)"""
+        raise NotImplementedError
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Process-local buckets. Past `max_keys`, the least recently used buckets are dropped."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at, rate, burst), oldest use first
+        self._lock = threading.Lock()
+
+    def consume(self, buckets, take=True):
+        now = _time.monotonic()
+        with self._lock:
+            levels = []
+            for index, (key, rate, burst) in enumerate(buckets):
+                tokens, updated_at, _, _ = self._buckets.get(key, (burst, now, rate, burst))
+                tokens = min(burst, tokens + (now - updated_at) * rate)
+                if tokens < 1:
+                    self._buckets.move_to_end(key)
+                    return index, (1 - tokens) / rate
+                levels.append(tokens)
+            if not take:
+                return None, 0.0
+            for (key, rate, burst), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens - 1, now, rate, burst)
+                self._buckets.move_to_end(key)
+            # At most len(buckets) new keys per call, so this evicts a bounded number
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return None, 0.0
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """Buckets shared across workers and hosts, checked and updated atomically by a Lua script."""
+
+    SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local levels = {}
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[2 * i + 1])
+        local burst = tonumber(ARGV[2 * i + 2])
+        local tokens = tonumber(redis.call('HGET', key, 't') or burst)
+        local updated = tonumber(redis.call('HGET', key, 'u') or now)
+        tokens = math.min(burst, tokens + (now - updated) * rate)
+        if tokens < 1 then return {i, tostring(tokens)} end
+        levels[i] = tokens
+    end
+    if ARGV[2] == '0' then return {0, '0'} end
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[2 * i + 1])
+        local burst = tonumber(ARGV[2 * i + 2])
+        redis.call('HSET', key, 't', levels[i] - 1, 'u', now)
+        redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+    end
+    return {0, '0'}
+    """
+
+    def __init__(self, client, prefix="ratelimit:"):
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+    def consume(self, buckets, take=True):
+        args = [_time.time(), 1 if take else 0]
+        for _, rate, burst in buckets:
+            args += [rate, burst]
+        blocked, tokens = self._script(keys=[self.prefix + key for key, _, _ in buckets], args=args)
+        if not blocked:
+            return None, 0.0
+        index = int(blocked) - 1
+        return index, (1 - float(tokens)) / buckets[index][1]
+
+
+# ===========================
+# Admission Controller
+# ===========================
+class AdmissionController:
+    """Rejects excess requests before the view runs.
+
+    Write requests to endpoints in RATE_LIMITS pass through token buckets
+    keyed by logged-in user, by client IP and by endpoint; a token is taken
+    from each only if none is empty, otherwise the request gets 429 with
+    Retry-After. Endpoints in ENDPOINT_CLASSES also share a per-class cap on
+    in-flight requests (CONCURRENCY_LIMITS, counting only the methods in
+    CONCURRENCY_METHODS for that class); when it is full the request gets
+    503 with Retry-After. The caps are per worker process and only matter
+    with threaded workers (gunicorn gthread). Rejections are counted in
+    `metrics` and logged.
+
+    The ip and endpoint buckets and the caps are checked in WSGI middleware,
+    before Flask opens the session, so those rejections do no database
+    work. The user bucket needs the session's user id and is checked in a
+    before_request hook, so a request rejected by it costs one session
+    lookup. Wrap ProxyFix around the app after init_app() so the middleware
+    sees client IPs; a warning is logged once if proxied requests arrive
+    while TRUSTED_PROXIES is 0.
+    """
+
+    def __init__(self, app=None, store=None):
+        self.store = store
+        self.metrics = Counter()  # (endpoint, reason) -> rejections
+        self._semaphores = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["admission"] = self
+        if not app.config.get("RATE_LIMIT_ENABLED", True):
+            return
+        if self.store is None:
+            self.store = create_rate_limit_store(app)
+        self.limits = {
+            endpoint: {scope: parse_limit(limit) for scope, limit in scopes.items()}
+            for endpoint, scopes in app.config.get("RATE_LIMITS", {}).items()}
+        self.trusted_proxies = app.config.get("TRUSTED_PROXIES", 0)
+        self._warned_proxy = False
+        self.classes = app.config.get("ENDPOINT_CLASSES", {})
+        self.class_methods = app.config.get("CONCURRENCY_METHODS", {})
+        self._semaphores = {
+            name: threading.BoundedSemaphore(limit)
+            for name, limit in app.config.get("CONCURRENCY_LIMITS", {}).items()}
+        self.url_map = app.url_map
+        app.wsgi_app = self._middleware(app.wsgi_app)
+        app.before_request(self._admit)
+
+    def _reject(self, endpoint, method, path, status, reason, retry_after):
+        self.metrics[(endpoint, reason)] += 1
+        logger.warning("Rejected %s %s (%s, retry after %ss)", method, path, reason, retry_after)
+        message = "Too many requests, please retry later." if status == 429 else "Server busy, please retry shortly."
+        return Response(message, status, {"Retry-After": str(retry_after)}, mimetype="text/plain")
+
+    def _buckets(self, endpoint, limits, remote_addr, user_id=None):
+        """Bucket keys for a request, most specific first."""
+        keys = []
+        if "user" in limits and user_id:
+            keys.append(("user", f"{endpoint}:user:{user_id}"))
+        if "ip" in limits:
+            keys.append(("ip", f"{endpoint}:ip:{remote_addr}"))
+        if "endpoint" in limits:
+            keys.append(("endpoint", f"{endpoint}:all"))
+        return keys
+
+    def _check(self, keys, limits, take):
+        """Returns (scope, seconds to wait) for the first empty bucket, or None."""
+        if not keys:
+            return None
+        blocked, wait = self.store.consume([(key, *limits[scope]) for scope, key in keys], take=take)
+        if blocked is None:
+            return None
+        return keys[blocked][0], max(1, math.ceil(wait))
+
+    def _endpoint(self, environ):
+        try:
+            endpoint, _ = self.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None  # 404/405/redirects are left to Flask
+        return endpoint
+
+    # --- Before the session is opened ---
+    def _middleware(self, wsgi_app):
+        def admission_middleware(environ, start_response):
+            endpoint = self._endpoint(environ)
+            method = environ.get("REQUEST_METHOD")
+            path = environ.get("PATH_INFO")
+            limits = self.limits.get(endpoint)
+            if limits and method == "POST":
+                self._check_proxy(environ)
+                # Only looks at the shared buckets; tokens are taken in _admit
+                rejected = self._check(self._buckets(endpoint, limits, environ.get("REMOTE_ADDR")), limits, take=False)
+                if rejected:
+                    scope, wait = rejected
+                    return self._reject(endpoint, method, path, 429, f"rate:{scope}", wait)(environ, start_response)
+
+            name = self.classes.get(endpoint)
+            semaphore = self._semaphores.get(name)
+            if semaphore is None or method not in self.class_methods.get(name, (method,)):
+                return wsgi_app(environ, start_response)
+            if not semaphore.acquire(blocking=False):
+                return self._reject(endpoint, method, path, 503, f"concurrency:{name}", 1)(environ, start_response)
+            try:
+                return _ReleasingBody(wsgi_app(environ, start_response), semaphore.release)
+            except BaseException:
+                semaphore.release()
+                raise
+        return admission_middleware
+
+    def _check_proxy(self, environ):
+        if not self.trusted_proxies and not self._warned_proxy and "HTTP_X_FORWARDED_FOR" in environ:
+            self._warned_proxy = True
+            logger.warning("Request came through a proxy but TRUSTED_PROXIES is 0; "
+                           "per-IP rate limits see the proxy's address and apply to all clients behind it")
+
+    # --- After the session is opened ---
+    def _admit(self):
+        endpoint = request.endpoint
+        limits = self.limits.get(endpoint)
+        if not limits or request.method != "POST":
+            return None
+        keys = self._buckets(endpoint, limits, request.remote_addr, session.get("user_id"))
+        rejected = self._check(keys, limits, take=True)
+        if rejected:
+            scope, wait = rejected
+            return self._reject(endpoint, request.method, request.path, 429, f"rate:{scope}", wait)
+        return None
+
+
+class _ReleasingBody:
+    """Response body that calls `release` once, when it is exhausted or closed.
+
+    Holds the concurrency slot until a streamed response has been sent."""
+
+    def __init__(self, body, release):
+        self.body = body
+        self._release = release
+        self._released = False
+
+    def __iter__(self):
+        try:
+            yield from self.body
+        finally:
+            self._release_once()
+
+    def close(self):
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            self._release_once()
+
+    def _release_once(self):
+        if not self._released:
+            self._released = True
+            self._release()
+
+
+def create_rate_limit_store(app):
+    """Builds the store selected by the RATE_LIMIT_BACKEND config value ("memory" or "redis")."""
+    backend = app.config.get("RATE_LIMIT_BACKEND", "memory")
+    if backend == "memory":
+        return MemoryRateLimitStore()
+    if backend == "redis":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND='redis' requires the 'redis' package") from e
+        return RedisRateLimitStore(redis.Redis.from_url(app.config["RATE_LIMIT_REDIS_URL"]))
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
@@ -1,9 +1,23 @@
 
-from flask import Flask, render_template, request, redirect, url_for, session, abort, flash
-from models import User, Doctor, Patient, Appointment, MedicalRecord, AuditLog, db
+from flask import Flask, render_template, request, redirect, url_for, session, abort, flash, Response, stream_with_context, jsonify
+from werkzeug.middleware.proxy_fix import ProxyFix
+import click
+from models import User, Doctor, Patient, Appointment, MedicalRecord, AuditLog, WaitlistEntry, db
 from functools import wraps
+from collections import namedtuple
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, time, date
+from datetime import datetime, time, date, timedelta
+import services
+from services import log_action
+from sessions import create_session_interface, revoke_user_sessions
+import reminders
+import exports
+from db_profiles import init_backend_profile, count_where, index_statements
+import waitlist
+from profiling import RequestProfiler
+from admission import AdmissionController
+import schedule
+from reference_cache import doctor_cache, doctor_refs, patient_refs
 
 
 # ===========================
@@ -12,23 +26,29 @@ from datetime import datetime, time, date
 app = Flask(__name__)
 app.config.from_object("config")
 app.secret_key = "supersecretkey"
-db.init_app(app)
+init_backend_profile(app)  # Also runs db.init_app()
+app.session_interface = create_session_interface(app)
+app.jinja_env.globals.update(doctor_refs=doctor_refs, patient_refs=patient_refs)
+admission = AdmissionController(app)  # Registered first so rejected requests skip all other work
+if app.config.get("TRUSTED_PROXIES"):
+    # Outermost, so the admission middleware already sees the client IP
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["TRUSTED_PROXIES"])
+profiler = RequestProfiler(app)
 
 
 # ===========================
 # Database Seeding
 # ===========================
 def seed_db_if_needed():
-    """Seeds the database with default admin, doctors, patients, appointments, and medical records."""
+    """Seeds the database with default admin, doctors, patients, appointments, and medical records.
+
+    Everything is written in a single transaction; ids come from flush()."""
     if not User.query.filter_by(username="admin").first():
         admin = User(
             username="admin",
             password=generate_password_hash("admin123"),
             role="admin")
         db.session.add(admin)
-        db.session.commit()
-
-        
 
     # --- Doctors ---
     doctors_to_seed = [
@@ -37,20 +57,12 @@ def seed_db_if_needed():
     ]
     for doc in doctors_to_seed:
         if not User.query.filter_by(username=doc["username"]).first():
-            user = User(
-                username=doc["username"],
-                password=generate_password_hash("123"),
-                role="doctor")
-            db.session.add(user)
-            db.session.commit()
-
-            doctor = Doctor(
+            user = services.create_user(doc["username"], "123", "doctor")
+            db.session.add(Doctor(
                 user_id=user.id,
                 name=doc["name"],
                 specialization=doc["specialization"],
-                phone=doc["phone"])
-            db.session.add(doctor)
-            db.session.commit()
+                phone=doc["phone"]))
 
     # --- Patients ---
     patients_to_seed = [
@@ -59,23 +71,13 @@ def seed_db_if_needed():
     ]
     for pat in patients_to_seed:
         if not User.query.filter_by(username=pat["username"]).first():
-            user = User(
-                username=pat["username"],
-                password=generate_password_hash("123"),
-                role="patient")
-            db.session.add(user)
-            db.session.commit()
-
-            patient = Patient(
+            user = services.create_user(pat["username"], "123", "patient")
+            db.session.add(Patient(
                 user_id=user.id,
                 name=pat["name"],
                 age=pat["age"],
                 gender=pat["gender"],
-                phone=pat["phone"])
-            db.session.add(patient)
-            db.session.commit()
-
-            
+                phone=pat["phone"]))
 
     # --- Appointments ---
     if Appointment.query.count() == 0:
@@ -98,9 +100,9 @@ def seed_db_if_needed():
             time=time(11, 30),
             status="Pending")
         db.session.add_all([appt1, appt2])
-        db.session.commit()  # Commit the appointments to the database
+        db.session.flush()  # Assign appointment ids without committing
 
-        # --- Medical Records (after appointments are committed) ---
+        # --- Medical Records ---
         record1 = MedicalRecord(
             appointment_id=appt1.id,
             diagnosis="Hypertension",
@@ -111,7 +113,8 @@ def seed_db_if_needed():
             diagnosis="Migraine",
             prescription="Tricyclic")
         db.session.add_all([record1, record2])
-        db.session.commit()
+
+    db.session.commit()
 
 
 
@@ -144,23 +147,6 @@ def role_required(role):
         return wrapper
     return decorator
 
-# ===========================
-# Logging Function
-# ===========================
-def log_action(user, action_desc):
-    """Logs an action to the AuditLog table.
-      Args:
-        user (User or None): User performing the action. If None, logs as 'System'.
-        action_desc (str): Description of the action performed."""
-    log_entry = AuditLog(
-        user_id=user.id if user else None,
-        username=user.username if user else "System",
-        role=user.role if user else None,
-        action=str(action_desc).strip()
-    )
-    db.session.add(log_entry)
-    db.session.commit()
-
 # ===========================
 # Helper Functions
 # ===========================
@@ -172,12 +158,47 @@ def get_user(role):
 
     Returns:
         Doctor or Patient instance, or None if not found."""
+    model = {"doctor": Doctor, "patient": Patient}.get(role)
+    if model is not None and session.get("role") == role and session.get("profile_id"):
+        # Primary-key lookup using the profile id cached in the session at login
+        return db.session.get(model, session["profile_id"])
     if role == "doctor":
         return Doctor.query.filter_by(user_id=session["user_id"]).first()
     elif role == "patient":
         return Patient.query.filter_by(user_id=session["user_id"]).first()
     return None
 
+ProfileRef = namedtuple("ProfileRef", ("id", "name"))
+
+def current_profile(role):
+    """Returns the current doctor's/patient's id and name without a database query.
+
+    Uses the profile id and display name cached in the session at login, so
+    views that only filter by the id skip the profile lookup. Views that
+    edit the profile or follow its relationships need get_user().
+
+    Args:
+        role (str): 'doctor' or 'patient'
+
+    Returns:
+        ProfileRef, or get_user(role) for sessions without a cached profile."""
+    if session.get("role") == role and session.get("profile_id"):
+        return ProfileRef(session["profile_id"], session.get("display_name"))
+    return get_user(role)
+
+def cache_profile_in_session(user):
+    """Stores the user's doctor/patient profile id and display name in the session.
+
+    Args:
+        user (User): The logged-in user."""
+    profile = None
+    if user.role == "doctor":
+        profile = Doctor.query.filter_by(user_id=user.id).first()
+    elif user.role == "patient":
+        profile = Patient.query.filter_by(user_id=user.id).first()
+    session["profile_id"] = profile.id if profile else None
+    session["display_name"] = profile.name if profile else user.username
+
 def paginate_query(query, page, per_page=10):
     """Paginates a SQLAlchemy query.
 
@@ -190,6 +211,24 @@ def paginate_query(query, page, per_page=10):
         Pagination object."""
     return query.paginate(page=page, per_page=per_page, error_out=False)
 
+def export_response(filename, start_id=None, end_id=None):
+    """Streams a FHIR-style NDJSON export, gzipped when ?compress=gzip.
+
+    Args:
+        filename (str): Download name without extension.
+        start_id (int or None): Lowest patient id to include.
+        end_id (int or None): Highest patient id to include.
+
+    Returns:
+        Response: Chunked streaming response."""
+    compress = request.args.get("compress") == "gzip"
+    body = exports.iter_ndjson(exports.iter_resources(start_id, end_id), compress=compress)
+    extension = "ndjson.gz" if compress else "ndjson"
+    return Response(
+        stream_with_context(body),
+        mimetype="application/gzip" if compress else "application/fhir+ndjson",
+        headers={"Content-Disposition": f"attachment; filename={filename}.{extension}"})
+
 def validate_appointment_date_time(date_str, time_str):
     """Validates appointment date and time.
 
@@ -223,9 +262,11 @@ def login():
     if request.method == "POST":
         user = User.query.filter_by(username=request.form["username"]).first()
         if user and check_password_hash(user.password, request.form["password"]):
+            session.regenerate()
             session["user_id"] = user.id
             session["username"] = user.username
             session["role"] = user.role
+            cache_profile_in_session(user)
             
             return redirect(url_for("index"))
         
@@ -261,8 +302,10 @@ def index():
 def admin_index():
     """Renders admin dashboard with statistics and recent appointments."""
     today = datetime.now().strftime("%A, %B %d")
-    total_appointments = Appointment.query.count()
-    completed_appointments = Appointment.query.filter_by(status="Completed").count()
+    # Total and completed counts in a single scan
+    total_appointments, completed_appointments = db.session.query(
+        db.func.count(Appointment.id),
+        count_where(Appointment.status == "Completed")).one()
     pending_appointments = total_appointments - completed_appointments
     stats = {
         "doctors": Doctor.query.count(),
@@ -293,22 +336,13 @@ def new_doctor():
             flash(f"Doctor with username '{username}' already exists", "danger")
             return render_template("doctor_new.html")
 
-        user = User(
+        doctor = services.add_doctor(
             username=username,
-            password=generate_password_hash(request.form["password"]),
-            role="doctor")
-        db.session.add(user)
-        db.session.commit()
-
-        doctor = Doctor(
-            user_id=user.id,
+            password=request.form["password"],
             name=request.form["name"],
             specialization=request.form["specialization"],
-            phone=request.form["phone"])
-        db.session.add(doctor)
-        db.session.commit()
-
-        log_action(User.query.get(session["user_id"]), f"Added new doctor {doctor.name}")
+            phone=request.form["phone"],
+            actor=User.query.get(session["user_id"]))
 
         flash(f"Doctor '{doctor.name}' added successfully", "success")
         return redirect(url_for("admin_doctors"))
@@ -348,9 +382,11 @@ def delete_doctor(doctor_id):
         return redirect(url_for("admin_doctors"))
 
     user = User.query.get_or_404(doctor.user_id)
+    waitlist.forget_doctor(doctor.id)  # Freed slots outlive the appointments they came from
     db.session.delete(doctor)
     db.session.delete(user)
     db.session.commit()
+    revoke_user_sessions(user.id)
 
     log_action(User.query.get(session["user_id"]), f"Deleted doctor {doctor.name}")
 
@@ -410,12 +446,30 @@ def delete_patient(patient_id):
     db.session.delete(patient)  
     db.session.delete(user) 
     db.session.commit() 
+    revoke_user_sessions(user.id)
     
     log_action(User.query.get(session["user_id"]), f"Deleted patient {patient.name}")
 
     flash("Patient deleted successfully", "success")
     return redirect(url_for("admin_patients"))
 
+@app.route("/admin/patient/<int:patient_id>/export")
+@role_required("admin")
+def admin_export_patient(patient_id):
+    """Downloads one patient's appointments and medical records."""
+    patient = Patient.query.get_or_404(patient_id)
+    log_action(User.query.get(session["user_id"]), f"Exported records of patient {patient.name}")
+    return export_response(f"patient-{patient.id}", patient.id, patient.id)
+
+@app.route("/admin/export")
+@role_required("admin")
+def admin_export_all():
+    """Downloads all patients' records, optionally limited to a patient id range."""
+    start_id = request.args.get("start_id", type=int)
+    end_id = request.args.get("end_id", type=int)
+    log_action(User.query.get(session["user_id"]), f"Exported patient records (ids {start_id or 'first'}-{end_id or 'last'})")
+    return export_response("patients", start_id, end_id)
+
 @app.route("/admin/audit")
 @role_required("admin")
 def admin_audit():
@@ -442,6 +496,39 @@ def get_page_range(current_page, total_pages, visible_pages=5):
 
     return range(start_page, end_page + 1)
 
+@app.route("/admin/profiles")
+@role_required("admin")
+def admin_profiles():
+    """Lists the most recent request profiles captured by this worker."""
+    return render_template("admin_profiles.html", profiles=list(profiler.profiles), enabled=profiler.enabled)
+
+@app.route("/admin/profiles/<profile_id>")
+@role_required("admin")
+def admin_profile_detail(profile_id):
+    """Shows one request profile with its SQL statements and call tree."""
+    profile = profiler.get(profile_id)
+    if profile is None:
+        abort(404)
+    return render_template("admin_profile_detail.html", profile=profile)
+
+@app.route("/admin/profiles/<profile_id>/download")
+@role_required("admin")
+def admin_profile_download(profile_id):
+    """Downloads a profile as a .prof file (cProfile) or folded stacks for flamegraph tools."""
+    profile = profiler.get(profile_id)
+    if profile is None:
+        abort(404)
+    return Response(
+        profile["raw"],
+        mimetype="application/octet-stream" if profile["format"] == "prof" else "text/plain",
+        headers={"Content-Disposition": f"attachment; filename=profile-{profile['id']}.{profile['format']}"})
+
+@app.route("/admin/admission")
+@role_required("admin")
+def admin_admission_metrics():
+    """Returns rejection counts from rate limiting and concurrency caps for this worker."""
+    return jsonify({f"{endpoint} {reason}": count for (endpoint, reason), count in admission.metrics.items()})
+
 @app.route("/admin/clear_audit_log", methods=["GET", "POST"])
 @role_required("admin")
 def clear_audit_log():
@@ -465,7 +552,7 @@ def clear_audit_log():
 @role_required("doctor")
 def doctor_appointments():
     """Displays a paginated list of the doctor's appointments."""
-    doctor = get_user("doctor")
+    doctor = current_profile("doctor")
     page = request.args.get('page', 1, type=int)
 
     appointments = Appointment.query.filter_by(
@@ -473,14 +560,67 @@ def doctor_appointments():
 
     # Get today's date to compare with appointment date
     current_date = datetime.today().date()
+
+    # Medical record ids for the whole page in one query
+    record_ids = schedule.record_ids_for(appt.id for appt in appointments.items)
    
-    return render_template("doctor_appointments.html", appointments=appointments, doctor=doctor, current_date=current_date)
+    return render_template("doctor_appointments.html", appointments=appointments, doctor=doctor, current_date=current_date, record_ids=record_ids)
+
+def schedule_range():
+    """Reads the schedule date range from ?view=today|week&start=YYYY-MM-DD[&end=YYYY-MM-DD].
+
+    Returns:
+        tuple(date, date, str): (start, end, view); aborts with 400 on invalid input."""
+    view = request.args.get("view", "week")
+    try:
+        start = datetime.strptime(request.args["start"], "%Y-%m-%d").date() if request.args.get("start") else date.today()
+        end = datetime.strptime(request.args["end"], "%Y-%m-%d").date() if request.args.get("end") else None
+    except ValueError:
+        abort(400, description="Invalid date format.")
+
+    if end is not None:
+        view = "range"
+    elif view == "today":
+        end = start
+    else:
+        view = "week"
+        start, end = schedule.week_bounds(start)
+
+    if end < start or (end - start).days >= schedule.MAX_SCHEDULE_DAYS:
+        abort(400, description=f"Date range must be 1-{schedule.MAX_SCHEDULE_DAYS} days.")
+    return start, end, view
+
+@app.route("/doctor/schedule")
+@role_required("doctor")
+def doctor_schedule():
+    """Displays the doctor's appointments grouped by day and time slot."""
+    doctor = current_profile("doctor")
+    start, end, view = schedule_range()
+    days = schedule.build_schedule(doctor.id, start, end)
+    step = timedelta(days=1 if view == "today" else 7)
+
+    return render_template(
+        "doctor_schedule.html", doctor=doctor, days=days, view=view, start=start, end=end,
+        current_date=date.today(), prev_start=start - step, next_start=start + step)
+
+@app.route("/doctor/schedule.json")
+@role_required("doctor")
+def doctor_schedule_api():
+    """Returns the doctor's schedule for a date range as JSON."""
+    doctor = current_profile("doctor")
+    start, end, view = schedule_range()
+    return jsonify({
+        "doctor_id": doctor.id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": schedule.schedule_to_json(schedule.build_schedule(doctor.id, start, end)),
+    })
 
 @app.route("/doctor/records")
 @role_required("doctor")
 def doctor_records():
     """Displays a paginated list of medical records for the logged-in doctor."""
-    doctor = get_user("doctor")
+    doctor = current_profile("doctor")
 
     if not doctor:
         flash("Doctor profile not found", "danger")
@@ -497,25 +637,16 @@ def doctor_records():
 @app.route("/doctor/record/<int:appointment_id>", methods=["GET", "POST"])
 @role_required("doctor")
 def add_record(appointment_id):
-    doctor = get_user("doctor")
+    doctor = current_profile("doctor")
     appointment = Appointment.query.get_or_404(appointment_id)
 
     if request.method == "POST":
-        # Add the medical record
-        record = MedicalRecord(
-            appointment_id=appointment.id,
+        # Add the medical record and mark the appointment "Completed" in one transaction
+        services.add_medical_record(
+            appointment,
             diagnosis=request.form["diagnosis"],
-            prescription=request.form["prescription"])
-        
-        # Update the status of the appointment to "Completed"
-        appointment.status = "Completed"
-
-        db.session.add(record)
-        db.session.commit()
-
-        log_action(  
-            User.query.get(session["user_id"]),
-            f"Added medical record for appointment {appointment.id}")
+            prescription=request.form["prescription"],
+            actor=User.query.get(session["user_id"]))
         flash("Medical record added successfully", "success")
         return redirect(url_for("doctor_appointments"))
 
@@ -526,7 +657,7 @@ def add_record(appointment_id):
 @role_required("doctor")
 def edit_medical_record(record_id):
     """Edits an existing medical record."""
-    doctor = get_user("doctor")
+    doctor = current_profile("doctor")
     record = MedicalRecord.query.get_or_404(record_id)
 
     if request.method == "POST":
@@ -545,7 +676,7 @@ def edit_medical_record(record_id):
 @role_required("doctor")
 def doctor_view_patient_list():
     """Displays a paginated list of patients with optional search for doctors."""
-    doctor = get_user("doctor")
+    doctor = current_profile("doctor")
     page = request.args.get('page', 1, type=int)   
     query = request.args.get("search", "")  
 
@@ -561,7 +692,7 @@ def doctor_view_patient_list():
 @role_required("doctor")
 def doctor_view_patient(patient_id):
     """Displays details and medical records of a specific patient for the doctor."""
-    doctor = get_user("doctor")
+    doctor = current_profile("doctor")
     patient = Patient.query.get_or_404(patient_id)
    
     records = MedicalRecord.query.join(Appointment).filter(Appointment.patient_id == patient.id).all()
@@ -580,21 +711,13 @@ def register():
             flash("Username already exists", "danger")
             return render_template("register.html")
 
-        user = User(
+        services.register_patient(
             username=request.form["username"],
-            password=generate_password_hash(request.form["password"]),
-            role="patient")
-        db.session.add(user)
-        db.session.commit()
-
-        patient = Patient(
-            user_id=user.id,
+            password=request.form["password"],
             name=request.form["name"],
             age=request.form["age"],
             gender=request.form["gender"],
-            phone=request.form["phone"] )
-        db.session.add(patient)
-        db.session.commit()
+            phone=request.form["phone"])
 
         flash("Patient registered successfully", "success")
         return redirect(url_for("login"))
@@ -614,6 +737,7 @@ def patient_index():
         patient.gender = request.form["gender"]
         patient.phone = request.form["phone"]
         db.session.commit()
+        session["display_name"] = patient.name
 
         log_action(User.query.get(session["user_id"]), "Updated patient profile")
         flash("Profile updated successfully", "success")
@@ -624,11 +748,11 @@ def patient_index():
 @role_required("patient")
 def book_appointment():
     """Allows a patient to book a new appointment with validation."""
-    patient = get_user("patient")  
+    patient = current_profile("patient")  
     if not patient:
         abort(400, description="Patient profile not found.")
     
-    doctors = Doctor.query.all()
+    doctors = doctor_cache.get_all()
     today_str = date.today().isoformat() 
     
     if request.method == "POST":
@@ -643,17 +767,13 @@ def book_appointment():
         # Check if the appointment is in the future (if so, set status to 'Pending')
         status = "Pending" if appt_date >= date.today() else "Completed"
 
-        appointment = Appointment(
-            patient_id=patient.id,
+        services.book_appointment(
+            patient,
             doctor_id=int(request.form["doctor_id"]),
-            date=appt_date,
-            time=appt_time,
-            status=status)
-        
-        db.session.add(appointment)
-        db.session.commit()
-
-        log_action(User.query.get(session["user_id"]), f"Booked appointment for patient {patient.name}")
+            appt_date=appt_date,
+            appt_time=appt_time,
+            status=status,
+            actor=User.query.get(session["user_id"]))
 
         flash("Appointment booked successfully", "success")
         return redirect(url_for("patient_appointments"))
@@ -665,7 +785,7 @@ def book_appointment():
 @role_required("patient")
 def patient_appointments():
     """Displays a paginated list of the patient's appointments."""
-    patient = get_user("patient")
+    patient = current_profile("patient")
     page = request.args.get('page', 1, type=int)
 
     # Get today's date to compare with appointment date
@@ -686,19 +806,26 @@ def patient_appointments():
     appointments = Appointment.query.filter_by(
         patient_id=patient.id).order_by(Appointment.date.desc()).paginate(page=page, per_page=10, error_out=False)
 
-    return render_template("patient_appointments.html", appointments=appointments, patient=patient, current_date=current_date, current_time=current_time)
+    # Earlier slots offered from the waitlist and appointments already waitlisted
+    offers = waitlist.open_offers(patient.id)
+    waitlisted_ids = {entry.appointment_id for entry in WaitlistEntry.query.filter(
+        WaitlistEntry.patient_id == patient.id,
+        WaitlistEntry.status.in_(("Waiting", "Offered")))}
+
+    return render_template("patient_appointments.html", appointments=appointments, patient=patient, current_date=current_date, current_time=current_time,
+                           offers=offers, waitlisted_ids=waitlisted_ids)
 
 @app.route("/patient/appointment/edit/<int:appointment_id>", methods=["GET", "POST"])
 @role_required("patient")
 def edit_appointment(appointment_id):
     """Edits an existing patient appointment."""
-    patient = get_user("patient") 
+    patient = current_profile("patient") 
     appointment = Appointment.query.get_or_404(appointment_id)
 
     if appointment.patient_id != patient.id:
         abort(403)
     
-    doctors = Doctor.query.all()
+    doctors = doctor_cache.get_all()
     today_str = date.today().isoformat() 
     
     if request.method == "POST":
@@ -708,13 +835,14 @@ def edit_appointment(appointment_id):
             flash(error_msg, "danger")
             return redirect(request.url)
 
-        appointment.date = datetime.strptime(request.form["date"], "%Y-%m-%d").date()
-        appointment.time = datetime.strptime(request.form["time"], "%H:%M").time()
-        appointment.doctor_id = int(request.form["doctor_id"])
-        
-        db.session.commit()
-
-        log_action(User.query.get(session["user_id"]), f"Updated appointment {appointment.id} for patient {patient.name}")
+        # Moving the appointment offers its old slot to the doctor's waitlist
+        waitlist.reschedule_appointment(
+            appointment,
+            doctor_id=int(request.form["doctor_id"]),
+            appt_date=datetime.strptime(request.form["date"], "%Y-%m-%d").date(),
+            appt_time=datetime.strptime(request.form["time"], "%H:%M").time(),
+            actor=User.query.get(session["user_id"]),
+            patient_name=patient.name)
         
         flash("Appointment updated successfully", "success")
         return redirect(url_for("patient_appointments"))
@@ -734,21 +862,55 @@ def cancel_appointment(appointment_id):
         flash("Cannot cancel this appointment because it has a medical record", "warning")
         return redirect(url_for("patient_appointments"))
 
-    db.session.delete(appointment)
-    db.session.commit()
-
-    log_action(User.query.get(session["user_id"]), f"Canceled appointment {appointment.id}")
+    # Deletes the appointment and offers the freed slot to the doctor's waitlist
+    waitlist.cancel_appointment(appointment, actor=User.query.get(session["user_id"]))
     
     flash("Appointment canceled successfully", "success")
     return redirect(url_for("patient_appointments"))
 
 
+@app.route("/patient/appointment/<int:appointment_id>/waitlist")
+@role_required("patient")
+def join_waitlist(appointment_id):
+    """Adds the patient to the doctor's waitlist for an earlier slot."""
+    patient = current_profile("patient")
+    appointment = Appointment.query.get_or_404(appointment_id)
+
+    if appointment.patient_id != patient.id:
+        abort(403)
+
+    if waitlist.join_waitlist(appointment):
+        flash("You are on the waitlist. We will offer you an earlier slot if one frees up.", "success")
+    else:
+        flash("Only upcoming pending appointments can join the waitlist", "warning")
+    return redirect(url_for("patient_appointments"))
+
+@app.route("/patient/offer/<int:slot_id>/claim")
+@role_required("patient")
+def claim_slot(slot_id):
+    """Moves the patient's appointment into an offered earlier slot."""
+    patient = get_user("patient")
+    if waitlist.claim_offer(slot_id, patient):
+        flash("Your appointment was moved to the earlier slot", "success")
+    else:
+        flash("This slot is no longer available", "warning")
+    return redirect(url_for("patient_appointments"))
+
+@app.route("/patient/offer/<int:slot_id>/decline")
+@role_required("patient")
+def decline_slot(slot_id):
+    """Declines an offered slot and leaves the waitlist."""
+    patient = current_profile("patient")
+    if waitlist.decline_offer(slot_id, patient):
+        flash("Offer declined", "info")
+    return redirect(url_for("patient_appointments"))
+
 
 @app.route("/patient/records")
 @role_required("patient")
 def patient_records():
     """Displays a paginated list of a patient's medical records with optional search."""
-    patient = get_user("patient")
+    patient = current_profile("patient")
 
     search = request.args.get('search', '').strip()  
     page = request.args.get('page', 1, type=int)  
@@ -769,6 +931,63 @@ def patient_records():
 
     return render_template("patient_records.html", records=records)
 
+@app.route("/patient/records/export")
+@role_required("patient")
+def patient_export_records():
+    """Downloads the logged-in patient's appointments and medical records."""
+    patient = current_profile("patient")
+    log_action(User.query.get(session["user_id"]), "Exported own medical records")
+    return export_response(f"patient-{patient.id}", patient.id, patient.id)
+
+# -------------------------------------------------
+# CLI COMMANDS
+# -------------------------------------------------
+@app.cli.command("send-reminders")
+@click.option("--days-ahead", default=1, show_default=True, help="Days after today to include.")
+@click.option("--workers", default=None, type=int, help="Worker processes (0 = inline).")
+def send_reminders_command(days_ahead, workers):
+    """Sends reminders for upcoming pending appointments (safe to re-run)."""
+    delivered = reminders.send_reminders(
+        reminders.create_transport(app.config),
+        days_ahead=days_ahead,
+        batch_size=app.config["REMINDER_BATCH_SIZE"],
+        workers=app.config["REMINDER_WORKERS"] if workers is None else workers)
+    log_action(None, f"Sent {delivered} appointment reminders")
+    click.echo(f"Sent {delivered} reminders")
+
+@app.cli.command("export-records")
+@click.option("--start-id", type=int, default=None, help="Lowest patient id to export.")
+@click.option("--end-id", type=int, default=None, help="Highest patient id to export.")
+@click.option("--output", required=True, type=click.Path(dir_okay=False), help="File to write.")
+@click.option("--gzip", "compress", is_flag=True, help="Gzip the output.")
+def export_records_command(start_id, end_id, output, compress):
+    """Exports patient records as FHIR-style NDJSON.
+
+    Run several processes with disjoint --start-id/--end-id ranges to parallelize."""
+    with open(output, "wb") as f:
+        for chunk in exports.iter_ndjson(exports.iter_resources(start_id, end_id), compress=compress):
+            f.write(chunk)
+    log_action(None, f"Exported patient records (ids {start_id or 'first'}-{end_id or 'last'}) to {output}")
+    click.echo(f"Wrote {output}")
+
+@app.cli.command("create-indexes")
+@click.option("--sql", "print_sql", is_flag=True, help="Print the DDL instead of running it.")
+def create_indexes_command(print_sql):
+    """Creates missing tables and indexes on an existing database (safe to re-run).
+
+    Run after upgrading: db.create_all() leaves existing tables untouched, so
+    new indexes on appointment and medical_record are only created here."""
+    statements = index_statements()
+    if print_sql:
+        for statement in statements:
+            click.echo(f"{str(statement.compile(dialect=db.engine.dialect)).strip()};")
+        return
+    db.create_all()
+    with db.engine.begin() as conn:
+        for statement in statements:
+            conn.execute(statement)
+    click.echo(f"Ensured {len(statements)} indexes")
+
 # -------------------------------------------------
 # MAIN
 # -------------------------------------------------
@@ -0,0 +1,138 @@
+"""Write-throughput benchmark for the add-doctor and bulk-insert write paths.
+
+Compares the old flow (commit User, commit Doctor, commit AuditLog) with the
+single-transaction services.add_doctor(), and row-by-row inserts with
+db_profiles.bulk_insert() (COPY on Postgres, executemany elsewhere).
+Password hashing is replaced by a constant so only database cost is
+measured. Doctor rows are added with unique usernames and left in place, so
+point it at a scratch database. Run it once per backend to compare them:
+
+Usage:
+    python bench/write_paths.py [-n 300]
+    python bench/write_paths.py --database-url postgresql://localhost/hospital_bench [-n 300]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import Column, Integer, MetaData, String, Table
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BULK_BATCH = 500
+
+bulk_table = Table(
+    "bench_bulk_insert", MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("label", String(100), nullable=True),
+    Column("amount", Integer, nullable=True),
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None,
+                        help="Scratch database (default: a temporary SQLite file).")
+    parser.add_argument("-n", type=int, default=300, help="Operations per path.")
+    return parser.parse_args()
+
+
+def setup_app(database_url):
+    """Imports the app against `database_url`; config is read at import time."""
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SESSION_BACKEND", "memory")
+    sys.path.insert(0, ROOT)
+    import app as hospital_app
+    return hospital_app
+
+
+def bench(label, n, operation):
+    start = time.perf_counter()
+    for i in range(n):
+        operation(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {n / elapsed:8.1f} ops/s  ({elapsed * 1000 / n:.2f} ms/op)")
+    return n / elapsed
+
+
+def run_write_paths(hospital_app, n):
+    import services
+    from models import AuditLog, Doctor, User, db
+
+    services.generate_password_hash = lambda password: "bench"
+    run = uuid.uuid4().hex[:8]
+    admin = User.query.filter_by(username="admin").first()
+
+    def legacy(i):
+        user = User(username=f"bench-{run}-legacy-{i}", password="bench", role="doctor")
+        db.session.add(user)
+        db.session.commit()
+        doctor = Doctor(user_id=user.id, name="Bench", specialization="Bench", phone="0")
+        db.session.add(doctor)
+        db.session.commit()
+        db.session.add(AuditLog(user_id=admin.id, username=admin.username, role=admin.role,
+                                action=f"Added new doctor {doctor.name}"))
+        db.session.commit()
+
+    def unit_of_work(i):
+        services.add_doctor(f"bench-{run}-uow-{i}", "x", "Bench", "Bench", "0", actor=admin)
+
+    before = bench("add doctor (3 commits)", n, legacy)
+    after = bench("add doctor (unit of work)", n, unit_of_work)
+    print(f"{'speedup':<28} {after / before:8.2f}x")
+
+
+def run_bulk_insert(n):
+    """Inserts n batches of BULK_BATCH rows into a scratch table, one commit per batch.
+
+    Must run inside an app context. Returns ops/s (batches) per path."""
+    from db_profiles import bulk_insert
+    from models import db
+
+    bulk_table.drop(db.engine, checkfirst=True)
+    bulk_table.create(db.engine)
+    next_id = iter(range(1, 2 * n * BULK_BATCH + 1))
+
+    def batch():
+        return [{"id": next(next_id), "label": None if j % 10 == 0 else f"row {j}", "amount": j}
+                for j in range(BULK_BATCH)]
+
+    def row_by_row(i):
+        for row in batch():
+            db.session.execute(bulk_table.insert().values(**row))
+        db.session.commit()
+
+    def bulk(i):
+        bulk_insert(bulk_table, batch())
+        db.session.commit()
+
+    try:
+        results = {
+            "row by row": bench(f"insert {BULK_BATCH} (row by row)", n, row_by_row),
+            "bulk_insert": bench(f"insert {BULK_BATCH} (bulk_insert)", n, bulk),
+        }
+        print(f"{'speedup':<28} {results['bulk_insert'] / results['row by row']:8.2f}x")
+        return results
+    finally:
+        db.session.rollback()
+        bulk_table.drop(db.engine, checkfirst=True)
+
+
+def main():
+    args = parse_args()
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    hospital_app = setup_app(database_url)
+    from models import db
+
+    with hospital_app.app.app_context():
+        db.create_all()
+        hospital_app.seed_db_if_needed()
+        print(f"backend: {db.engine.dialect.name}")
+        run_write_paths(hospital_app, args.n)
+        run_bulk_insert(max(1, args.n // 10))
+
+
+if __name__ == "__main__":
+    main()
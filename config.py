@@ -8,6 +8,66 @@ SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "postgresql://hospital_db_v5
 
 #SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL","sqlite:///hospital.db")
 
+# Backend tuning applied at connect time (see db_profiles.py)
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "hospital-management")
+# Applies to web requests only (SET LOCAL per transaction); CLI commands run without it
+PG_STATEMENT_TIMEOUT_MS = int(os.getenv("PG_STATEMENT_TIMEOUT_MS", "5000"))
+PG_STATEMENT_TIMEOUT_EXEMPT = {"admin_export_all"}  # Long-running streamed endpoints
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "mmap_size": 256 * 1024 * 1024,
+}
 
+# Server-side sessions: "sqlalchemy" (shared across workers), "memory" (tests) or "redis"
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlalchemy")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_IDLE_TIMEOUT = int(os.getenv("SESSION_IDLE_TIMEOUT", "7200"))  # seconds
+SESSION_SWEEP_INTERVAL = 300  # seconds between expired-session sweeps
 
+# Appointment reminders ("file" writes JSON lines locally, "smtp" sends via REMINDER_SMTP_HOST)
+REMINDER_TRANSPORT = os.getenv("REMINDER_TRANSPORT", "file")
+REMINDER_FILE_PATH = os.getenv("REMINDER_FILE_PATH", "reminders.ndjson")
+REMINDER_SMTP_HOST = os.getenv("REMINDER_SMTP_HOST", "localhost")
+REMINDER_SMTP_PORT = int(os.getenv("REMINDER_SMTP_PORT", "1025"))
+REMINDER_SMTP_SENDER = os.getenv("REMINDER_SMTP_SENDER", "reminders@medicalcare.local")
+REMINDER_SMTP_RECIPIENT_DOMAIN = os.getenv("REMINDER_SMTP_RECIPIENT_DOMAIN", "sms.medicalcare.local")
+REMINDER_WORKERS = int(os.getenv("REMINDER_WORKERS", "4"))
+REMINDER_BATCH_SIZE = 1000
 
+# Request profiling (opt-in). Profiles requests sent with PROFILER_HEADER (by an admin,
+# or carrying PROFILER_TOKEN), a random PROFILER_SAMPLE_RATE fraction, and any request
+# slower than PROFILER_SLOW_MS. Admins view them at /admin/profiles.
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+PROFILER_HEADER = "X-Profile"
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0"))
+PROFILER_SLOW_MS = int(os.getenv("PROFILER_SLOW_MS", "1000"))
+PROFILER_SAMPLE_INTERVAL_MS = 10
+PROFILER_RING_SIZE = 20
+
+# Admission control for write endpoints (see admission.py)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" or "redis"
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/1")
+# Reverse proxies in front of the app whose X-Forwarded-For is trusted (applied with ProxyFix).
+# Without it every client shares the proxy's IP and the "ip" buckets act clinic-wide. Render,
+# the documented deployment, sets RENDER=true and adds one proxy hop, so that is the default there.
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", "1" if os.getenv("RENDER") else "0"))
+RATE_LIMITS = {  # POST requests only; scopes: ip / user / endpoint
+    "login": {"ip": "20/minute", "endpoint": "600/minute"},
+    "register": {"ip": "5/minute", "endpoint": "120/minute"},
+    "book_appointment": {"user": "10/minute", "ip": "60/minute", "endpoint": "600/minute"},
+}
+ENDPOINT_CLASSES = {
+    "login": "write",
+    "register": "write",
+    "book_appointment": "write",
+    "admin_export_all": "export",
+    "admin_export_patient": "export",
+    "patient_export_records": "export",
+}
+CONCURRENCY_LIMITS = {"write": 8, "export": 2}  # In-flight requests per class and worker
+CONCURRENCY_METHODS = {"write": ("POST",)}  # Only these methods count against the class; unlisted classes count all
@@ -0,0 +1,160 @@
+import csv
+import io
+import sqlite3
+import weakref
+
+from flask import has_request_context, request
+from sqlalchemy import case, event, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from models import db
+
+
+# ===========================
+# Connect-time Tuning
+# ===========================
+def engine_options(config):
+    """Builds SQLALCHEMY_ENGINE_OPTIONS for the configured database backend.
+
+    Postgres gets an application name via connect args (the statement
+    timeout is set per web transaction, see `init_backend_profile`). SQLite
+    is tuned with PRAGMAs in `_tune_sqlite` on each connect.
+
+    Args:
+        config (dict): Flask config.
+
+    Returns:
+        dict: Engine options to merge into SQLALCHEMY_ENGINE_OPTIONS."""
+    backend = make_url(config["SQLALCHEMY_DATABASE_URI"]).get_backend_name()
+    options = {"pool_pre_ping": True}
+    if backend == "postgresql":
+        options["connect_args"] = {
+            "application_name": config.get("DB_APPLICATION_NAME", "hospital-management"),
+        }
+    elif backend == "sqlite":
+        options["connect_args"] = {"timeout": config.get("SQLITE_BUSY_TIMEOUT_MS", 5000) / 1000}
+    return options
+
+
+def init_backend_profile(app):
+    """Applies engine options, initializes `db` for the app and attaches the backend hooks.
+
+    Call instead of db.init_app(). SQLite PRAGMAs are applied by a connect
+    listener on the app's own engines. The Postgres statement timeout is
+    issued with SET LOCAL at the start of each ORM transaction inside a web
+    request, so it ends with the transaction and never reaches CLI jobs
+    (export-records, send-reminders) or endpoints listed in
+    PG_STATEMENT_TIMEOUT_EXEMPT. Hooks are attached per engine, so creating
+    several apps (tests, scripts) does not stack listeners."""
+    options = engine_options(app.config)
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+    db.init_app(app)
+
+    pragmas = app.config.get("SQLITE_PRAGMAS", {})
+    timeout_ms = int(app.config.get("PG_STATEMENT_TIMEOUT_MS", 5000))
+    exempt = frozenset(app.config.get("PG_STATEMENT_TIMEOUT_EXEMPT", ()))
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == "sqlite" and pragmas:
+            event.listen(engine, "connect", _sqlite_tuner(pragmas))
+        elif engine.dialect.name == "postgresql" and timeout_ms:
+            _statement_timeouts[engine] = (timeout_ms, exempt)
+            if not event.contains(Session, "after_begin", _request_statement_timeout):
+                event.listen(Session, "after_begin", _request_statement_timeout)
+
+
+_statement_timeouts = weakref.WeakKeyDictionary()  # engine -> (timeout_ms, exempt endpoints)
+
+
+def _sqlite_tuner(pragmas):
+    def _tune_sqlite(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return _tune_sqlite
+
+
+def _request_statement_timeout(session, transaction, connection):
+    settings = _statement_timeouts.get(connection.engine)
+    if settings is None or not has_request_context():
+        return
+    timeout_ms, exempt = settings
+    if request.endpoint not in exempt:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+
+# ===========================
+# Schema Upgrades
+# ===========================
+def index_statements():
+    """Returns CREATE INDEX IF NOT EXISTS statements for every model index.
+
+    db.create_all() only creates missing tables, so indexes added to tables
+    that already exist (ix_appointment_date_id, ix_appointment_doctor_date_time,
+    ix_medical_record_appointment_id) have to be created with these."""
+    return [CreateIndex(index, if_not_exists=True)
+            for table in db.metadata.sorted_tables
+            for index in sorted(table.indexes, key=lambda index: index.name)]
+
+
+# ===========================
+# Dialect-specific Fast Paths
+# ===========================
+def dialect_name():
+    return db.engine.dialect.name
+
+
+def supports_aggregate_filter():
+    """FILTER (WHERE ...) is supported by Postgres and SQLite >= 3.30; MySQL needs CASE."""
+    name = dialect_name()
+    if name == "postgresql":
+        return True
+    return name == "sqlite" and sqlite3.sqlite_version_info >= (3, 30, 0)
+
+
+def count_where(condition):
+    """Conditional count usable next to other aggregates in one SELECT.
+
+    Args:
+        condition: SQLAlchemy boolean expression.
+
+    Returns:
+        ColumnElement: COUNT(*) FILTER (WHERE cond), or SUM(CASE ...) where FILTER is unsupported."""
+    if supports_aggregate_filter():
+        return func.count().filter(condition)
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def bulk_insert(table, rows):
+    """Inserts many rows in the current transaction using the fastest path for the backend.
+
+    Postgres (psycopg2) streams the rows with COPY FROM STDIN; other backends
+    use executemany. The caller commits.
+
+    Args:
+        table (Table): Target table.
+        rows (list[dict]): Rows with identical keys."""
+    if not rows:
+        return
+    connection = db.session.connection()
+    if dialect_name() == "postgresql" and connection.dialect.driver == "psycopg2":
+        columns = list(rows[0].keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["\\N" if row[c] is None else row[c] for c in columns])
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        preparer = connection.dialect.identifier_preparer
+        column_list = ", ".join(preparer.quote(c) for c in columns)
+        cursor.copy_expert(
+            f"COPY {preparer.format_table(table)} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer)
+        cursor.close()
+    else:
+        db.session.execute(table.insert(), rows)
@@ -0,0 +1,153 @@
+import json
+import zlib
+
+from sqlalchemy import select
+
+from models import Appointment, Doctor, MedicalRecord, Patient, db
+
+CHUNK_SIZE = 64 * 1024  # Bytes buffered before a chunk is handed to the response
+
+
+# ===========================
+# FHIR-style Resources
+# ===========================
+def _patient_resource(patient_id, name, age, gender, phone):
+    return {
+        "resourceType": "Patient",
+        "id": str(patient_id),
+        "name": [{"text": name}],
+        "gender": (gender or "").lower() or None,
+        "extension": [{"url": "age", "valueInteger": age}],
+        "telecom": [{"system": "phone", "value": phone}] if phone else [],
+    }
+
+
+def _practitioner_resource(doctor_id, name, specialization, phone):
+    return {
+        "resourceType": "Practitioner",
+        "id": str(doctor_id),
+        "name": [{"text": name}],
+        "qualification": [{"code": {"text": specialization}}],
+        "telecom": [{"system": "phone", "value": phone}] if phone else [],
+    }
+
+
+def _encounter_resource(appt_id, patient_id, doctor_id, appt_date, appt_time, status):
+    start = appt_date.isoformat()
+    if appt_time is not None:
+        start += "T" + appt_time.strftime("%H:%M:%S")
+    return {
+        "resourceType": "Encounter",
+        "id": str(appt_id),
+        "status": "finished" if status == "Completed" else "planned",
+        "subject": {"reference": f"Patient/{patient_id}"},
+        "participant": [{"individual": {"reference": f"Practitioner/{doctor_id}"}}],
+        "period": {"start": start},
+    }
+
+
+def _record_resources(record_id, appt_id, patient_id, diagnosis, prescription):
+    encounter = {"reference": f"Encounter/{appt_id}"}
+    subject = {"reference": f"Patient/{patient_id}"}
+    return (
+        {
+            "resourceType": "Condition",
+            "id": f"{record_id}-condition",
+            "subject": subject,
+            "encounter": encounter,
+            "code": {"text": diagnosis},
+        },
+        {
+            "resourceType": "MedicationRequest",
+            "id": f"{record_id}-medication",
+            "subject": subject,
+            "encounter": encounter,
+            "medicationCodeableConcept": {"text": prescription},
+        },
+    )
+
+
+# ===========================
+# Streaming Export
+# ===========================
+def iter_resources(start_id=None, end_id=None, yield_per=1000):
+    """Streams FHIR-style resources for patients with start_id <= id <= end_id.
+
+    Uses a single ordered join read through a server-side cursor
+    (`yield_per`), so memory does not grow with the number of patients.
+    Each Practitioner is emitted once, before its first Encounter.
+
+    Args:
+        start_id (int or None): Lowest patient id to include.
+        end_id (int or None): Highest patient id to include.
+        yield_per (int): Rows fetched from the cursor at a time.
+
+    Yields:
+        dict: One resource at a time."""
+    stmt = (
+        select(
+            Patient.id, Patient.name, Patient.age, Patient.gender, Patient.phone,
+            Appointment.id, Appointment.date, Appointment.time, Appointment.status,
+            Doctor.id, Doctor.name, Doctor.specialization, Doctor.phone,
+            MedicalRecord.id, MedicalRecord.diagnosis, MedicalRecord.prescription)
+        .outerjoin(Appointment, Appointment.patient_id == Patient.id)
+        .outerjoin(Doctor, Appointment.doctor_id == Doctor.id)
+        .outerjoin(MedicalRecord, MedicalRecord.appointment_id == Appointment.id)
+        .order_by(Patient.id, Appointment.id, MedicalRecord.id)
+        .execution_options(yield_per=yield_per))
+    if start_id is not None:
+        stmt = stmt.where(Patient.id >= start_id)
+    if end_id is not None:
+        stmt = stmt.where(Patient.id <= end_id)
+
+    current_patient = current_appt = None
+    seen_doctors = set()
+    for row in db.session.execute(stmt):
+        (patient_id, p_name, p_age, p_gender, p_phone,
+         appt_id, appt_date, appt_time, status,
+         doctor_id, d_name, d_spec, d_phone,
+         record_id, diagnosis, prescription) = row
+
+        if patient_id != current_patient:
+            current_patient = patient_id
+            yield _patient_resource(patient_id, p_name, p_age, p_gender, p_phone)
+        if appt_id is None:
+            continue
+        if appt_id != current_appt:
+            current_appt = appt_id
+            if doctor_id not in seen_doctors:
+                seen_doctors.add(doctor_id)
+                yield _practitioner_resource(doctor_id, d_name, d_spec, d_phone)
+            yield _encounter_resource(appt_id, patient_id, doctor_id, appt_date, appt_time, status)
+        if record_id is not None:
+            yield from _record_resources(record_id, appt_id, patient_id, diagnosis, prescription)
+
+
+def iter_ndjson(resources, compress=False):
+    """Serializes resources as NDJSON in ~CHUNK_SIZE byte chunks, optionally gzipped.
+
+    Args:
+        resources (iterable[dict]): Resources to serialize.
+        compress (bool): Gzip the stream on the fly.
+
+    Yields:
+        bytes: Response body chunks."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits=31 -> gzip header
+    buffer = []
+    size = 0
+    for resource in resources:
+        line = json.dumps(resource, separators=(",", ":")).encode("utf-8") + b"\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            data = b"".join(buffer)
+            buffer, size = [], 0
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+    data = b"".join(buffer)
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
@@ -52,6 +52,11 @@ class Appointment(db.Model):
     time = db.Column(db.Time, nullable=True)
     status = db.Column(db.String(50), nullable=False, default="Pending")
 
+    __table_args__ = (
+        db.Index("ix_appointment_date_id", "date", "id"),  # Reminder scans by date window
+        db.Index("ix_appointment_doctor_date_time", "doctor_id", "date", "time"),  # Doctor schedule ranges
+    )
+
     medical_record = db.relationship("MedicalRecord", backref="appointment", uselist=False)
 
 # -------------------------------
@@ -59,7 +64,7 @@ class Appointment(db.Model):
 # -------------------------------
 class MedicalRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    appointment_id = db.Column(db.Integer, db.ForeignKey("appointment.id"), nullable=False)
+    appointment_id = db.Column(db.Integer, db.ForeignKey("appointment.id"), nullable=False, index=True)
     diagnosis = db.Column(db.Text, nullable=False)
     prescription = db.Column(db.Text, nullable=False)
 
@@ -81,3 +86,57 @@ class AuditLog(db.Model):
     user = db.relationship('User', backref='audit_logs', lazy=True)
 
  
+
+# -------------------------------
+# Server-side Session
+# -------------------------------
+class UserSession(db.Model):
+    sid = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=True, index=True)  # No FK: sessions are revoked right after the user's deletion commits
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# -------------------------------
+# Reminder Sent Marker
+# -------------------------------
+class ReminderSent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    appointment_id = db.Column(db.Integer, db.ForeignKey("appointment.id", ondelete="CASCADE"), nullable=False)
+    kind = db.Column(db.String(20), nullable=False, default="upcoming")
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("appointment_id", "kind", name="uq_reminder_sent_appointment_kind"),
+    )
+
+# -------------------------------
+# Waitlist
+# -------------------------------
+class WaitlistEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey("doctor.id", ondelete="CASCADE"), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey("patient.id"), nullable=False)
+    appointment_id = db.Column(db.Integer, db.ForeignKey("appointment.id", ondelete="CASCADE"), nullable=False)  # Appointment to move earlier
+    before_date = db.Column(db.Date, nullable=False)  # Only slots before this date are offered
+    priority = db.Column(db.Integer, nullable=False, default=0)  # Higher is offered first
+    status = db.Column(db.String(20), nullable=False, default="Waiting")  # Waiting / Offered / Claimed / Declined
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Serves "highest-priority waiting patient for this doctor" as one index range scan
+        db.Index("ix_waitlist_match", "doctor_id", "status", db.desc("priority"), "created_at"),
+    )
+
+# -------------------------------
+# Freed Slot
+# -------------------------------
+class FreedSlot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey("doctor.id", ondelete="CASCADE"), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    time = db.Column(db.Time, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default="Offered")  # Offered / Claimed / Unclaimed
+    offered_entry_id = db.Column(db.Integer, db.ForeignKey("waitlist_entry.id", ondelete="SET NULL"), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    offered_entry = db.relationship("WaitlistEntry", lazy=True)
@@ -0,0 +1,234 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time as _time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+
+from flask import g, has_request_context, request, session
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+MAX_SQL_PER_REQUEST = 200
+
+
+# ===========================
+# Request Profiler
+# ===========================
+class RequestProfiler:
+    """Opt-in per-request profiling with SQL and template timings.
+
+    A request is profiled with cProfile when it carries the PROFILER_HEADER
+    (from an admin session, or with PROFILER_TOKEN as its value) or is picked
+    by PROFILER_SAMPLE_RATE. Every other request is watched by a background
+    stack sampler and kept only if it takes longer than PROFILER_SLOW_MS.
+    The last PROFILER_RING_SIZE profiles are kept in memory per worker process.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.profiles = deque(maxlen=20)
+        self._active = {}  # thread id -> state of the request running on it
+        self._sampler = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["profiler"] = self
+        self.enabled = app.config.get("PROFILER_ENABLED", False)
+        if not self.enabled:
+            return
+        self.header = app.config.get("PROFILER_HEADER", "X-Profile")
+        self.token = app.config.get("PROFILER_TOKEN")
+        self.sample_rate = app.config.get("PROFILER_SAMPLE_RATE", 0.0)
+        self.slow_ms = app.config.get("PROFILER_SLOW_MS")
+        self.sample_interval = app.config.get("PROFILER_SAMPLE_INTERVAL_MS", 10) / 1000
+        self.profiles = deque(maxlen=app.config.get("PROFILER_RING_SIZE", 20))
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+        _listen_for_sql()
+
+    # --- Request lifecycle ---
+    def _requested(self):
+        value = request.headers.get(self.header)
+        if not value:
+            return False
+        if self.token:
+            return value == self.token
+        return session.get("role") == "admin"
+
+    def _start(self):
+        if request.endpoint == "static" or (request.endpoint or "").startswith("admin_profile"):
+            return
+        trigger = None
+        if self._requested():
+            trigger = "header"
+        elif self.sample_rate and random.random() < self.sample_rate:
+            trigger = "sample"
+        elif not self.slow_ms:
+            return
+
+        state = {
+            "start": _time.perf_counter(),
+            "trigger": trigger,
+            "profiler": None,
+            "samples": Counter(),
+            "sql": [],
+            "sql_count": 0,
+            "sql_ms": 0.0,
+            "render_ms": 0.0,
+        }
+        if trigger:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                state["profiler"] = profiler
+            except ValueError:
+                pass  # Another profiler is already active in this process
+        g._profile = state
+        if state["profiler"] is None:
+            self._watch(state)
+
+    def _finish(self, response):
+        state = g.pop("_profile", None)
+        if state is None:
+            return response
+        self._active.pop(threading.get_ident(), None)
+        duration_ms = (_time.perf_counter() - state["start"]) * 1000
+        profiler = state["profiler"]
+        if profiler is not None:
+            profiler.disable()
+        trigger = state["trigger"] or ("slow" if self.slow_ms and duration_ms >= self.slow_ms else None)
+        if trigger is None:
+            return response
+
+        entry = {
+            "id": uuid.uuid4().hex[:12],
+            "timestamp": datetime.now(),
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "trigger": trigger,
+            "duration_ms": duration_ms,
+            "sql_count": state["sql_count"],
+            "sql_ms": state["sql_ms"],
+            "render_ms": state["render_ms"],
+            "python_ms": max(0.0, duration_ms - state["sql_ms"] - state["render_ms"]),
+            "sql": state["sql"],
+        }
+        if profiler is not None:
+            stats = pstats.Stats(profiler, stream=io.StringIO())
+            stats.sort_stats("cumulative").print_stats(40)
+            entry["report"] = stats.stream.getvalue()
+            entry["raw"] = marshal.dumps(stats.stats)
+            entry["format"] = "prof"
+        else:
+            folded = "\n".join(f"{';'.join(stack)} {count}" for stack, count in state["samples"].most_common())
+            entry["report"] = folded or "(request finished before the first stack sample)"
+            entry["raw"] = folded.encode("utf-8")
+            entry["format"] = "folded"
+        self.profiles.appendleft(entry)
+        return response
+
+    def _teardown(self, exc):
+        # after_request is skipped on unhandled errors; make sure nothing stays active
+        self._active.pop(threading.get_ident(), None)
+        state = g.pop("_profile", None)
+        if state is not None and state["profiler"] is not None:
+            state["profiler"].disable()
+
+    # --- Template timings ---
+    def _render_started(self, sender, template, context, **extra):
+        state = _state()
+        if state is not None:
+            state["render_start"] = _time.perf_counter()
+
+    def _render_finished(self, sender, template, context, **extra):
+        state = _state()
+        if state is not None and "render_start" in state:
+            state["render_ms"] += (_time.perf_counter() - state.pop("render_start")) * 1000
+
+    # --- Stack sampler for slow-request capture ---
+    def _watch(self, state):
+        self._active[threading.get_ident()] = state
+        if self._sampler is None or not self._sampler.is_alive():
+            with self._lock:
+                # Started lazily so it also runs in workers forked after import
+                if self._sampler is None or not self._sampler.is_alive():
+                    self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                    self._sampler.start()
+
+    def _sample_loop(self):
+        while True:
+            _time.sleep(self.sample_interval)
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, state in list(self._active.items()):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    state["samples"][_folded_stack(frame)] += 1
+
+    # --- Access for the admin pages ---
+    def get(self, profile_id):
+        return next((p for p in self.profiles if p["id"] == profile_id), None)
+
+
+# ===========================
+# SQL Timings
+# ===========================
+_sql_listening = False
+
+
+def _state():
+    """Profile state of the request running on this thread, if it is being profiled."""
+    return g.get("_profile") if has_request_context() else None
+
+
+def _listen_for_sql():
+    """Registers the engine-wide SQL timers once per process, however many profilers exist."""
+    global _sql_listening
+    if not _sql_listening:
+        _sql_listening = True
+        event.listen(Engine, "before_cursor_execute", _sql_started)
+        event.listen(Engine, "after_cursor_execute", _sql_finished)
+
+
+def _sql_started(conn, cursor, statement, parameters, context, executemany):
+    if _state() is not None:
+        conn.info.setdefault("_profile_sql_start", []).append(_time.perf_counter())
+
+
+def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+    state = _state()
+    starts = conn.info.get("_profile_sql_start")
+    if state is None or not starts:
+        return
+    elapsed = (_time.perf_counter() - starts.pop()) * 1000
+    state["sql_count"] += 1
+    state["sql_ms"] += elapsed
+    if len(state["sql"]) < MAX_SQL_PER_REQUEST:
+        state["sql"].append((elapsed, " ".join(statement.split())[:1000]))
+
+
+def _folded_stack(frame):
+    """Returns a root-first stack tuple in flamegraph 'folded' naming."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return tuple(reversed(stack))
@@ -0,0 +1,151 @@
+import threading
+import time as _time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from models import Doctor, Patient, db
+
+
+# ===========================
+# Reference Data Cache
+# ===========================
+class ReferenceCache:
+    """Bounded LRU cache of rarely-changing columns of one model, keyed by id.
+
+    Entries are invalidated after the session commits a row update or delete
+    in this process; a rollback leaves the cache untouched. Other gunicorn
+    workers only see the change once their entry reaches `ttl`, so keep
+    `ttl` short.
+
+    Args:
+        model: SQLAlchemy model class.
+        columns (tuple[str]): Column names to cache (the id is always included).
+        maxsize (int): Maximum number of cached ids.
+        ttl (float): Seconds before an entry is reloaded.
+    """
+
+    def __init__(self, model, columns, maxsize=1024, ttl=300):
+        self.model = model
+        self.columns = ("id",) + tuple(columns)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ref_type = namedtuple(f"{model.__name__}Ref", self.columns)
+        self._entries = OrderedDict()  # id -> (ref, loaded_at)
+        self._all = None               # (list of refs, loaded_at) for get_all()
+        self._lock = threading.Lock()
+
+    def get(self, entity_id):
+        """Returns the cached reference for one id, or None if the row does not exist."""
+        return self.get_many([entity_id]).get(entity_id)
+
+    def get_many(self, ids):
+        """Resolves many ids with at most one query for the misses.
+
+        Args:
+            ids (iterable[int]): Ids to resolve; None values are ignored.
+
+        Returns:
+            dict[int, namedtuple]: Reference per id found."""
+        wanted = {i for i in ids if i is not None}
+        found = {}
+        now = _time.monotonic()
+        with self._lock:
+            for i in wanted:
+                entry = self._entries.get(i)
+                if entry is not None and now - entry[1] < self.ttl:
+                    self._entries.move_to_end(i)
+                    found[i] = entry[0]
+        missing = wanted - found.keys()
+        if missing:
+            cols = [getattr(self.model, c) for c in self.columns]
+            rows = db.session.query(*cols).filter(self.model.id.in_(missing)).all()
+            with self._lock:
+                for row in rows:
+                    ref = self.ref_type(*row)
+                    found[ref.id] = ref
+                    self._entries[ref.id] = (ref, now)
+                    self._entries.move_to_end(ref.id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return found
+
+    def get_all(self):
+        """Returns references for every row, ordered by id (for dropdowns)."""
+        now = _time.monotonic()
+        cached = self._all
+        if cached is not None and now - cached[1] < self.ttl:
+            return cached[0]
+        cols = [getattr(self.model, c) for c in self.columns]
+        refs = [self.ref_type(*row) for row in db.session.query(*cols).order_by(self.model.id)]
+        self._all = (refs, now)
+        return refs
+
+    def invalidate(self, entity_id=None):
+        """Drops one id (or everything when None) and the get_all() list."""
+        with self._lock:
+            if entity_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(entity_id, None)
+            self._all = None
+
+    def invalidate_list(self):
+        """Drops only the get_all() list (a row was added)."""
+        self._all = None
+
+    def listen_for_changes(self):
+        """Queues invalidation on the model's insert/update/delete events.
+
+        The flush only records what changed; the cache is cleared in the
+        session's after_commit hook, so a concurrent reader between flush and
+        commit cannot re-cache the old row for the whole TTL."""
+        def on_change(mapper, connection, target):
+            _queue(target, self.invalidate, target.id)
+
+        def on_insert(mapper, connection, target):
+            _queue(target, self.invalidate_list)
+
+        event.listen(self.model, "after_update", on_change)
+        event.listen(self.model, "after_delete", on_change)
+        event.listen(self.model, "after_insert", on_insert)
+        return self
+
+
+PENDING_KEY = "reference_cache_pending"
+
+
+def _queue(target, callback, *args):
+    """Defers a cache invalidation until the target's session commits."""
+    session = object_session(target)
+    if session is None:
+        callback(*args)
+    else:
+        session.info.setdefault(PENDING_KEY, []).append((callback, args))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    for callback, args in session.info.pop(PENDING_KEY, []):
+        callback(*args)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop(PENDING_KEY, None)
+
+
+doctor_cache = ReferenceCache(Doctor, ("name", "specialization")).listen_for_changes()
+patient_cache = ReferenceCache(Patient, ("name",)).listen_for_changes()
+
+
+def doctor_refs(ids):
+    """Jinja helper: {id: DoctorRef} for a page of rows, in at most one query."""
+    return doctor_cache.get_many(ids)
+
+
+def patient_refs(ids):
+    """Jinja helper: {id: PatientRef} for a page of rows, in at most one query."""
+    return patient_cache.get_many(ids)
@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import smtplib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date, datetime, timedelta
+from email.message import EmailMessage
+
+from sqlalchemy import and_, tuple_
+
+from db_profiles import bulk_insert
+from models import Appointment, Doctor, Patient, ReminderSent, db
+
+logger = logging.getLogger(__name__)
+
+REMINDER_KIND = "upcoming"
+
+
+# ===========================
+# Transports
+# ===========================
+class FileTransport:
+    """Appends reminders as JSON lines to a local file (offline stand-in for SMS/email).
+
+    Args:
+        path (str): File to append to."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send_many(self, messages):
+        """Writes a batch with a single append so concurrent workers don't interleave lines.
+
+        Returns:
+            list[int]: Appointment ids that were delivered."""
+        payload = "".join(json.dumps(m, default=str) + "\n" for m in messages).encode("utf-8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, payload)
+        finally:
+            os.close(fd)
+        return [m["appointment_id"] for m in messages]
+
+
+class SMTPTransport:
+    """Sends reminders through an SMTP server, e.g. a local debugging server.
+
+    Patients only have phone numbers, so recipients are addressed as
+    `<phone>@<recipient_domain>` (an email-to-SMS gateway).
+
+    Args:
+        host (str): SMTP host.
+        port (int): SMTP port.
+        sender (str): From address.
+        recipient_domain (str): Domain appended to the patient's phone number."""
+
+    def __init__(self, host, port, sender, recipient_domain):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipient_domain = recipient_domain
+
+    def send_many(self, messages):
+        """Sends a batch over one SMTP connection.
+
+        Returns:
+            list[int]: Appointment ids that were delivered."""
+        sent = []
+        with smtplib.SMTP(self.host, self.port) as smtp:
+            for m in messages:
+                email = EmailMessage()
+                email["From"] = self.sender
+                email["To"] = f"{m['phone']}@{self.recipient_domain}"
+                email["Subject"] = "MedicalCare appointment reminder"
+                email.set_content(m["text"])
+                try:
+                    smtp.send_message(email)
+                    sent.append(m["appointment_id"])
+                except smtplib.SMTPException:
+                    logger.exception("Reminder for appointment %s failed", m["appointment_id"])
+        return sent
+
+
+def create_transport(config):
+    """Builds the transport selected by the REMINDER_TRANSPORT config value."""
+    transport = config.get("REMINDER_TRANSPORT", "file")
+    if transport == "file":
+        return FileTransport(config.get("REMINDER_FILE_PATH", "reminders.ndjson"))
+    if transport == "smtp":
+        return SMTPTransport(
+            config.get("REMINDER_SMTP_HOST", "localhost"),
+            config.get("REMINDER_SMTP_PORT", 1025),
+            config.get("REMINDER_SMTP_SENDER", "reminders@medicalcare.local"),
+            config.get("REMINDER_SMTP_RECIPIENT_DOMAIN", "sms.medicalcare.local"))
+    raise ValueError(f"Unknown REMINDER_TRANSPORT: {transport}")
+
+
+# ===========================
+# Scanning
+# ===========================
+def iter_due_reminders(start, end, batch_size=1000):
+    """Yields batches of reminder messages for pending appointments in [start, end].
+
+    Pages through the window with keyset pagination on (date, id), which
+    the ix_appointment_date_id index serves directly. Each page is a short
+    query, so memory stays bounded by `batch_size` and no read transaction
+    is held open while sent-markers are written between pages. Appointments
+    that already have a sent-marker are excluded by an anti-join.
+
+    Args:
+        start (date): First day of the window.
+        end (date): Last day of the window.
+        batch_size (int): Rows per page.
+
+    Yields:
+        list[dict]: Messages ready for a transport."""
+    query = (
+        db.session.query(
+            Appointment.id, Appointment.date, Appointment.time,
+            Patient.name, Patient.phone, Doctor.name)
+        .join(Patient, Appointment.patient_id == Patient.id)
+        .join(Doctor, Appointment.doctor_id == Doctor.id)
+        .outerjoin(ReminderSent, and_(
+            ReminderSent.appointment_id == Appointment.id,
+            ReminderSent.kind == REMINDER_KIND))
+        .filter(
+            Appointment.date >= start,
+            Appointment.date <= end,
+            Appointment.status == "Pending",
+            Patient.phone.isnot(None),
+            ReminderSent.id.is_(None))
+        .order_by(Appointment.date, Appointment.id))
+
+    last = None
+    while True:
+        page = query
+        if last is not None:
+            page = page.filter(tuple_(Appointment.date, Appointment.id) > last)
+        rows = page.limit(batch_size).all()
+        db.session.rollback()  # End the read transaction between pages
+        if not rows:
+            return
+        last = (rows[-1][1], rows[-1][0])
+        yield [_build_message(*row) for row in rows]
+
+
+def _build_message(appt_id, appt_date, appt_time, patient_name, phone, doctor_name):
+    when = appt_date.strftime("%A, %B %d")
+    if appt_time is not None:
+        when += " at " + appt_time.strftime("%H:%M")
+    return {
+        "appointment_id": appt_id,
+        "phone": phone,
+        "text": f"Hello {patient_name}, this is a reminder of your appointment with {doctor_name} on {when}.",
+    }
+
+
+def mark_sent(appointment_ids):
+    """Records sent-markers for a batch in one bulk insert (COPY on Postgres).
+
+    Args:
+        appointment_ids (list[int]): Appointments whose reminder was delivered."""
+    if not appointment_ids:
+        return
+    now = datetime.utcnow()
+    bulk_insert(
+        ReminderSent.__table__,
+        [{"appointment_id": i, "kind": REMINDER_KIND, "sent_at": now} for i in appointment_ids])
+    db.session.commit()
+
+
+# ===========================
+# Pipeline
+# ===========================
+def _deliver(transport, messages):
+    """Worker entry point: sends one batch and returns the delivered ids."""
+    try:
+        return transport.send_many(messages)
+    except Exception:
+        logger.exception("Reminder batch of %d failed", len(messages))
+        return []
+
+
+def send_reminders(transport, days_ahead=1, start=None, batch_size=1000, workers=4):
+    """Sends reminders for pending appointments from `start` to `start + days_ahead`.
+
+    Batches are fanned out to a process pool with at most `2 * workers`
+    batches in flight, so memory stays bounded regardless of volume. Only
+    delivered appointments get a sent-marker; failed ones are retried on the
+    next run. Delivery is at-least-once: a crash between sending a batch and
+    marking it may resend that batch.
+
+    Args:
+        transport: Object with a picklable `send_many(messages)` method.
+        days_ahead (int): Size of the window in days.
+        start (date or None): First day of the window, defaults to today.
+        batch_size (int): Messages per batch.
+        workers (int): Worker processes; 0 sends inline in this process.
+
+    Returns:
+        int: Number of reminders delivered."""
+    start = start or date.today()
+    end = start + timedelta(days=days_ahead)
+    batches = iter_due_reminders(start, end, batch_size)
+    delivered = 0
+
+    if workers == 0:
+        for messages in batches:
+            sent = _deliver(transport, messages)
+            mark_sent(sent)
+            delivered += len(sent)
+        return delivered
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for messages in batches:
+            pending.add(pool.submit(_deliver, transport, messages))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    sent = future.result()
+                    mark_sent(sent)
+                    delivered += len(sent)
+        for future in pending:
+            sent = future.result()
+            mark_sent(sent)
+            delivered += len(sent)
+    return delivered
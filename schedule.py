@@ -0,0 +1,98 @@
+from datetime import timedelta
+from itertools import groupby
+
+from models import Appointment, MedicalRecord, Patient, db
+
+MAX_SCHEDULE_DAYS = 31
+
+
+# ===========================
+# Batched Lookups
+# ===========================
+def record_ids_for(appointment_ids):
+    """Maps appointment id -> medical record id for a batch, in one IN query.
+
+    Args:
+        appointment_ids (iterable[int]): Appointments to check.
+
+    Returns:
+        dict[int, int]: Only appointments that have a record are present."""
+    ids = list(set(appointment_ids))
+    if not ids:
+        return {}
+    rows = (db.session.query(MedicalRecord.appointment_id, MedicalRecord.id)
+            .filter(MedicalRecord.appointment_id.in_(ids)))
+    return dict(rows)
+
+
+# ===========================
+# Day Schedule
+# ===========================
+def week_bounds(day):
+    """Returns the Monday and Sunday of the week containing `day`."""
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=6)
+
+
+def build_schedule(doctor_id, start, end):
+    """Groups a doctor's appointments in [start, end] by day and time slot.
+
+    Uses one range query over ix_appointment_doctor_date_time and one batched
+    record lookup, so the cost grows with the range, not the doctor's history.
+    Days without appointments are included so the view shows the full range.
+
+    Args:
+        doctor_id (int): Doctor whose schedule to build.
+        start (date): First day.
+        end (date): Last day (inclusive, at most MAX_SCHEDULE_DAYS after start).
+
+    Returns:
+        list[dict]: One {"date", "slots": [{"time", "appointments": [...]}]} per day."""
+    rows = (db.session.query(
+                Appointment.id, Appointment.date, Appointment.time, Appointment.status,
+                Appointment.patient_id, Patient.name)
+            .join(Patient, Appointment.patient_id == Patient.id)
+            .filter(Appointment.doctor_id == doctor_id,
+                    Appointment.date >= start,
+                    Appointment.date <= end)
+            .order_by(Appointment.date, Appointment.time, Appointment.id)
+            .all())
+    records = record_ids_for(row[0] for row in rows)
+
+    by_day = {}
+    for day, day_rows in groupby(rows, key=lambda row: row[1]):
+        slots = []
+        for slot_time, slot_rows in groupby(day_rows, key=lambda row: row[2]):
+            slots.append({
+                "time": slot_time,
+                "appointments": [
+                    {
+                        "id": appt_id,
+                        "status": status,
+                        "patient_id": patient_id,
+                        "patient_name": patient_name,
+                        "record_id": records.get(appt_id),
+                    }
+                    for appt_id, _, _, status, patient_id, patient_name in slot_rows],
+            })
+        by_day[day] = slots
+
+    days = []
+    day = start
+    while day <= end:
+        days.append({"date": day, "slots": by_day.get(day, [])})
+        day += timedelta(days=1)
+    return days
+
+
+def schedule_to_json(days):
+    """Converts build_schedule() output to JSON-serializable data."""
+    return [
+        {
+            "date": day["date"].isoformat(),
+            "slots": [
+                {"time": slot["time"].strftime("%H:%M") if slot["time"] else None,
+                 "appointments": slot["appointments"]}
+                for slot in day["slots"]],
+        }
+        for day in days]
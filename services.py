@@ -0,0 +1,188 @@
+import time as _time
+from functools import wraps
+
+from sqlalchemy.exc import DBAPIError
+from werkzeug.security import generate_password_hash
+
+from models import User, Doctor, Patient, Appointment, MedicalRecord, AuditLog, db
+
+
+# ===========================
+# Unit of Work
+# ===========================
+SERIALIZATION_PGCODES = ("40001", "40P01")  # serialization_failure / deadlock_detected
+
+
+def is_serialization_failure(error):
+    """Checks whether a database error is safe to retry.
+
+    Args:
+        error (DBAPIError): Error raised by SQLAlchemy.
+
+    Returns:
+        bool: True for Postgres serialization failures/deadlocks and SQLite lock errors."""
+    orig = getattr(error, "orig", None)
+    if getattr(orig, "pgcode", None) in SERIALIZATION_PGCODES:
+        return True
+    return "database is locked" in str(orig).lower()
+
+
+def lock_doctor_schedule(doctor_id):
+    """Serializes appointment changes for one doctor until the transaction ends.
+
+    Takes a row lock on the doctor (SELECT ... FOR UPDATE) on Postgres, so a
+    slot check made after it cannot race a concurrent booking. SQLite has no
+    row locks; there the first writer wins and the other transaction fails
+    with "database is locked" and is retried by `transactional`."""
+    db.session.query(Doctor.id).filter_by(id=doctor_id).with_for_update().first()
+
+
+def transactional(retries=3, backoff=0.05):
+    """Decorator that runs a business operation as a single transaction.
+
+    The wrapped function only adds/flushes objects; the commit happens once
+    at the end. On a serialization failure the session is rolled back and the
+    whole operation is re-run, up to `retries` extra attempts.
+
+    Args:
+        retries (int): Number of retries after a serialization failure.
+        backoff (float): Base delay in seconds, doubled after each retry.
+
+    Returns:
+        function: Wrapped function returning the operation's result."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            attempt = 0
+            while True:
+                try:
+                    result = f(*args, **kwargs)
+                    db.session.commit()
+                    return result
+                except DBAPIError as e:
+                    db.session.rollback()
+                    if attempt >= retries or not is_serialization_failure(e):
+                        raise
+                    _time.sleep(backoff * (2 ** attempt))
+                    attempt += 1
+                except Exception:
+                    db.session.rollback()
+                    raise
+        return wrapper
+    return decorator
+
+
+# ===========================
+# Logging Function
+# ===========================
+def log_action(user, action_desc, commit=True):
+    """Logs an action to the AuditLog table.
+      Args:
+        user (User or None): User performing the action. If None, logs as 'System'.
+        action_desc (str): Description of the action performed.
+        commit (bool): Commit immediately. Pass False inside a unit of work."""
+    log_entry = AuditLog(
+        user_id=user.id if user else None,
+        username=user.username if user else "System",
+        role=user.role if user else None,
+        action=str(action_desc).strip()
+    )
+    db.session.add(log_entry)
+    if commit:
+        db.session.commit()
+    return log_entry
+
+
+# ===========================
+# Business Operations
+# ===========================
+def create_user(username, password, role):
+    """Adds a User row and flushes it so its id is available."""
+    user = User(
+        username=username,
+        password=generate_password_hash(password),
+        role=role)
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+@transactional()
+def register_patient(username, password, name, age, gender, phone, actor=None):
+    """Creates a patient user and profile in one transaction.
+
+    Args:
+        actor (User or None): User to record in the audit log, if any.
+
+    Returns:
+        Patient: The new patient profile."""
+    user = create_user(username, password, "patient")
+    patient = Patient(
+        user_id=user.id,
+        name=name,
+        age=age,
+        gender=gender,
+        phone=phone)
+    db.session.add(patient)
+    db.session.flush()
+    if actor is not None:
+        log_action(actor, f"Registered patient {patient.name}", commit=False)
+    return patient
+
+
+@transactional()
+def add_doctor(username, password, name, specialization, phone, actor=None):
+    """Creates a doctor user and profile in one transaction.
+
+    Args:
+        actor (User or None): Admin to record in the audit log, if any.
+
+    Returns:
+        Doctor: The new doctor profile."""
+    user = create_user(username, password, "doctor")
+    doctor = Doctor(
+        user_id=user.id,
+        name=name,
+        specialization=specialization,
+        phone=phone)
+    db.session.add(doctor)
+    db.session.flush()
+    if actor is not None:
+        log_action(actor, f"Added new doctor {doctor.name}", commit=False)
+    return doctor
+
+
+@transactional()
+def add_medical_record(appointment, diagnosis, prescription, actor=None):
+    """Adds a medical record and completes its appointment in one transaction.
+
+    Returns:
+        MedicalRecord: The new record."""
+    record = MedicalRecord(
+        appointment_id=appointment.id,
+        diagnosis=diagnosis,
+        prescription=prescription)
+    appointment.status = "Completed"
+    db.session.add(record)
+    if actor is not None:
+        log_action(actor, f"Added medical record for appointment {appointment.id}", commit=False)
+    return record
+
+
+@transactional()
+def book_appointment(patient, doctor_id, appt_date, appt_time, status="Pending", actor=None):
+    """Books an appointment and writes its audit entry in one transaction.
+
+    Returns:
+        Appointment: The new appointment."""
+    lock_doctor_schedule(doctor_id)
+    appointment = Appointment(
+        patient_id=patient.id,
+        doctor_id=doctor_id,
+        date=appt_date,
+        time=appt_time,
+        status=status)
+    db.session.add(appointment)
+    if actor is not None:
+        log_action(actor, f"Booked appointment for patient {patient.name}", commit=False)
+    return appointment
@@ -0,0 +1,339 @@
+import secrets
+import threading
+import time as _time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from models import UserSession, db
+
+
+# ===========================
+# Session Object
+# ===========================
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict whose contents live in a SessionStore; the cookie only holds `sid`."""
+
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        self.modified = False
+        self.accessed = False
+        self.old_sid = None
+
+    def regenerate(self):
+        """Issues a fresh session id (call on login to prevent session fixation)."""
+        self.old_sid = self.sid
+        self.sid = new_session_id()
+        self.modified = True
+
+
+def new_session_id():
+    return secrets.token_urlsafe(32)
+
+
+# ===========================
+# Session Stores
+# ===========================
+class SessionStore:
+    """Backend interface. Payloads are opaque strings; expiry is an epoch timestamp."""
+
+    def get(self, sid):
+        """Returns (payload, expires_at) or None if missing/expired."""
+        raise NotImplementedError
+
+    def set(self, sid, payload, user_id, expires_at):
+        raise NotImplementedError
+
+    def touch(self, sid, expires_at):
+        raise NotImplementedError
+
+    def delete(self, sid):
+        raise NotImplementedError
+
+    def delete_for_user(self, user_id):
+        """Revokes every session belonging to `user_id`. Returns the number removed."""
+        raise NotImplementedError
+
+    def sweep(self, now):
+        """Removes expired sessions. Returns the number removed."""
+        return 0
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store for tests and single-worker development."""
+
+    def __init__(self):
+        self._sessions = {}   # sid -> (payload, user_id, expires_at)
+        self._by_user = {}    # user_id -> set of sids
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        entry = self._sessions.get(sid)
+        if entry is None or entry[2] <= _time.time():
+            return None
+        return entry[0], entry[2]
+
+    def set(self, sid, payload, user_id, expires_at):
+        with self._lock:
+            old = self._sessions.get(sid)
+            if old is not None and old[1] != user_id:
+                self._by_user.get(old[1], set()).discard(sid)
+            self._sessions[sid] = (payload, user_id, expires_at)
+            if user_id is not None:
+                self._by_user.setdefault(user_id, set()).add(sid)
+
+    def touch(self, sid, expires_at):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is not None:
+                self._sessions[sid] = (entry[0], entry[1], expires_at)
+
+    def delete(self, sid):
+        with self._lock:
+            entry = self._sessions.pop(sid, None)
+            if entry is not None:
+                self._by_user.get(entry[1], set()).discard(sid)
+
+    def delete_for_user(self, user_id):
+        with self._lock:
+            sids = self._by_user.pop(user_id, set())
+            for sid in sids:
+                self._sessions.pop(sid, None)
+            return len(sids)
+
+    def sweep(self, now):
+        with self._lock:
+            expired = [sid for sid, entry in self._sessions.items() if entry[2] <= now]
+            for sid in expired:
+                entry = self._sessions.pop(sid)
+                self._by_user.get(entry[1], set()).discard(sid)
+            return len(expired)
+
+
+class SqlSessionStore(SessionStore):
+    """Stores sessions in the `user_session` table (SQLite or Postgres).
+
+    Uses its own connection from the engine so session writes never mix with
+    the request's ORM transaction."""
+
+    table = UserSession.__table__
+
+    def get(self, sid):
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                self.table.select().where(self.table.c.sid == sid)).first()
+        if row is None or row.expires_at <= datetime.utcnow():
+            return None
+        return row.data, _to_epoch(row.expires_at)
+
+    def set(self, sid, payload, user_id, expires_at):
+        values = {"data": payload, "user_id": user_id, "expires_at": _from_epoch(expires_at)}
+        with db.engine.begin() as conn:
+            updated = conn.execute(
+                self.table.update().where(self.table.c.sid == sid).values(**values)).rowcount
+            if not updated:
+                conn.execute(self.table.insert().values(sid=sid, **values))
+
+    def touch(self, sid, expires_at):
+        with db.engine.begin() as conn:
+            conn.execute(
+                self.table.update().where(self.table.c.sid == sid)
+                .values(expires_at=_from_epoch(expires_at)))
+
+    def delete(self, sid):
+        with db.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.sid == sid))
+
+    def delete_for_user(self, user_id):
+        with db.engine.begin() as conn:
+            return conn.execute(
+                self.table.delete().where(self.table.c.user_id == user_id)).rowcount
+
+    def sweep(self, now):
+        with db.engine.begin() as conn:
+            return conn.execute(
+                self.table.delete().where(self.table.c.expires_at <= _from_epoch(now))).rowcount
+
+
+class RedisSessionStore(SessionStore):
+    """Stores sessions in Redis (or any client exposing get/set/delete/sadd/srem/smembers/expire).
+
+    Values are stored as "<expires_at>|<user_id>|<payload>" so touch() can
+    also refresh the TTL of the user's index set. Redis expires keys itself,
+    so sweep() is a no-op."""
+
+    def __init__(self, client, prefix="session:"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, sid):
+        return f"{self.prefix}{sid}"
+
+    def _user_key(self, user_id):
+        return f"{self.prefix}user:{user_id}"
+
+    def _read(self, sid):
+        """Returns (payload, user_id, expires_at) or None."""
+        raw = self.client.get(self._key(sid))
+        if raw is None:
+            return None
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        expires_at, user_id, payload = raw.split("|", 2)
+        return payload, int(user_id) if user_id else None, float(expires_at)
+
+    def get(self, sid):
+        entry = self._read(sid)
+        if entry is None:
+            return None
+        return entry[0], entry[2]
+
+    def set(self, sid, payload, user_id, expires_at):
+        ttl = max(1, int(expires_at - _time.time()))
+        self.client.set(self._key(sid), f"{expires_at}|{'' if user_id is None else user_id}|{payload}", ex=ttl)
+        if user_id is not None:
+            self.client.sadd(self._user_key(user_id), sid)
+            self.client.expire(self._user_key(user_id), ttl)
+
+    def touch(self, sid, expires_at):
+        entry = self._read(sid)
+        if entry is not None:
+            payload, user_id, _ = entry
+            self.set(sid, payload, user_id, expires_at)  # Also extends the user's index set
+
+    def delete(self, sid):
+        self.client.delete(self._key(sid))
+
+    def delete_for_user(self, user_id):
+        sids = self.client.smembers(self._user_key(user_id)) or set()
+        for sid in sids:
+            if isinstance(sid, bytes):
+                sid = sid.decode("utf-8")
+            self.client.delete(self._key(sid))
+        self.client.delete(self._user_key(user_id))
+        return len(sids)
+
+
+def _to_epoch(dt):
+    return (dt - datetime(1970, 1, 1)).total_seconds()
+
+
+def _from_epoch(ts):
+    return datetime(1970, 1, 1) + timedelta(seconds=ts)
+
+
+# ===========================
+# Session Interface
+# ===========================
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface backed by a SessionStore.
+
+    Args:
+        store (SessionStore): Where session payloads are kept.
+        idle_timeout (int): Seconds of inactivity before a session expires.
+        sweep_interval (int): Minimum seconds between expired-session sweeps.
+    """
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, idle_timeout=7200, sweep_interval=300):
+        self.store = store
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            entry = self.store.get(sid)
+            if entry is not None:
+                payload, expires_at = entry
+                return ServerSideSession(self.serializer.loads(payload), sid=sid, expires_at=expires_at)
+        return ServerSideSession(sid=new_session_id(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        now = _time.time()
+        self._maybe_sweep(now)
+
+        if session.old_sid:
+            self.store.delete(session.old_sid)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        expires_at = now + self.idle_timeout
+        if session.modified:
+            self.store.set(session.sid, self.serializer.dumps(dict(session)),
+                           session.get("user_id"), expires_at)
+        elif session.expires_at is not None and session.expires_at - now < self.idle_timeout - 60:
+            # Slide the idle window at most once a minute to keep reads write-free
+            self.store.touch(session.sid, expires_at)
+        else:
+            return
+
+        response.set_cookie(
+            name,
+            session.sid,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app))
+
+    def _maybe_sweep(self, now):
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self.store.sweep(now)
+
+
+def create_session_interface(app):
+    """Builds the session interface selected by the SESSION_BACKEND config value.
+
+    Args:
+        app (Flask): Application whose config is read.
+
+    Returns:
+        ServerSideSessionInterface"""
+    backend = app.config.get("SESSION_BACKEND", "sqlalchemy")
+    if backend == "memory":
+        store = MemorySessionStore()
+    elif backend == "sqlalchemy":
+        store = SqlSessionStore()
+    elif backend == "redis":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SESSION_BACKEND='redis' requires the 'redis' package") from e
+        store = RedisSessionStore(redis.Redis.from_url(app.config["SESSION_REDIS_URL"]))
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+    return ServerSideSessionInterface(
+        store,
+        idle_timeout=app.config.get("SESSION_IDLE_TIMEOUT", 7200),
+        sweep_interval=app.config.get("SESSION_SWEEP_INTERVAL", 300))
+
+
+def revoke_user_sessions(user_id):
+    """Logs out every session of a user, e.g. after their account is deleted.
+
+    Returns:
+        int: Number of sessions removed."""
+    interface = current_app.session_interface
+    if isinstance(interface, ServerSideSessionInterface):
+        return interface.store.delete_for_user(user_id)
+    return 0
@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+
+# app.py reads its config at import time, so point it at a scratch database first
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["SESSION_BACKEND"] = "memory"
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import app as hospital_app
+from models import db
+from reference_cache import doctor_cache, patient_cache
+
+
+@pytest.fixture
+def app():
+    """The Flask app with freshly created, seeded tables."""
+    flask_app = hospital_app.app
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        hospital_app.seed_db_if_needed()
+        doctor_cache.invalidate()
+        patient_cache.invalidate()
+        yield flask_app
+        db.session.remove()
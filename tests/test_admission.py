@@ -0,0 +1,121 @@
+import logging
+
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from admission import AdmissionController, MemoryRateLimitStore
+
+
+def limited_app(trusted_proxies):
+    flask_app = Flask(__name__)
+    flask_app.config.update(
+        SECRET_KEY="test",
+        RATE_LIMIT_ENABLED=True,
+        TRUSTED_PROXIES=trusted_proxies,
+        RATE_LIMITS={"login": {"ip": "1/minute"}})
+    flask_app.add_url_rule("/login", "login", lambda: "ok", methods=["POST"])
+    AdmissionController(flask_app)
+    if trusted_proxies:
+        flask_app.wsgi_app = ProxyFix(flask_app.wsgi_app, x_for=trusted_proxies)
+    return flask_app.test_client()
+
+
+def test_trusted_proxy_gives_each_client_its_own_ip_bucket():
+    client = limited_app(1)
+    assert client.post("/login", headers={"X-Forwarded-For": "10.0.0.1"}).status_code == 200
+    assert client.post("/login", headers={"X-Forwarded-For": "10.0.0.2"}).status_code == 200
+    assert client.post("/login", headers={"X-Forwarded-For": "10.0.0.1"}).status_code == 429
+
+
+def test_untrusted_proxy_is_reported_once(caplog):
+    client = limited_app(0)
+    with caplog.at_level(logging.WARNING, logger="admission"):
+        client.post("/login", headers={"X-Forwarded-For": "10.0.0.1"})
+        client.post("/login", headers={"X-Forwarded-For": "10.0.0.2"})
+    assert sum("TRUSTED_PROXIES is 0" in r.message for r in caplog.records) == 1
+
+
+def test_throttled_user_cannot_drain_the_endpoint_bucket():
+    flask_app = Flask(__name__)
+    flask_app.config.update(
+        SECRET_KEY="test",
+        RATE_LIMIT_ENABLED=True,
+        RATE_LIMITS={"book": {"user": "2/minute", "endpoint": "5/minute"}})
+    flask_app.add_url_rule("/book", "book", lambda: "ok", methods=["POST"])
+    AdmissionController(flask_app)
+
+    kiosk = flask_app.test_client()
+    with kiosk.session_transaction() as sess:
+        sess["user_id"] = 1
+    statuses = [kiosk.post("/book").status_code for _ in range(6)]
+    assert statuses == [200, 200, 429, 429, 429, 429]
+
+    other = flask_app.test_client()
+    with other.session_transaction() as sess:
+        sess["user_id"] = 2
+    assert [other.post("/book").status_code for _ in range(3)] == [200, 200, 429]
+    assert flask_app.extensions["admission"].metrics[("book", "rate:user")] == 5
+
+
+class CountingSessionInterface(SecureCookieSessionInterface):
+    opened = 0
+
+    def open_session(self, app, request):
+        self.opened += 1
+        return super().open_session(app, request)
+
+
+def test_shared_buckets_reject_before_the_session_is_opened():
+    flask_app = Flask(__name__)
+    flask_app.config.update(SECRET_KEY="test", RATE_LIMIT_ENABLED=True,
+                            RATE_LIMITS={"login": {"ip": "1/minute"}})
+    flask_app.add_url_rule("/login", "login", lambda: "ok", methods=["POST"])
+    flask_app.session_interface = sessions = CountingSessionInterface()
+    AdmissionController(flask_app)
+    client = flask_app.test_client()
+
+    assert client.post("/login").status_code == 200
+    opened = sessions.opened
+    response = client.post("/login")
+    assert response.status_code == 429 and response.headers["Retry-After"]
+    assert sessions.opened == opened
+
+
+def test_write_cap_only_counts_posts():
+    flask_app = Flask(__name__)
+    flask_app.config.update(
+        SECRET_KEY="test", RATE_LIMIT_ENABLED=True,
+        ENDPOINT_CLASSES={"login": "write", "export": "export"},
+        CONCURRENCY_LIMITS={"write": 0, "export": 0},  # Always full
+        CONCURRENCY_METHODS={"write": ("POST",)})
+    flask_app.add_url_rule("/", "login", lambda: "ok", methods=["GET", "POST"])
+    flask_app.add_url_rule("/export", "export", lambda: "ok")
+    AdmissionController(flask_app)
+    client = flask_app.test_client()
+
+    assert client.get("/").status_code == 200
+    assert client.post("/").status_code == 503
+    assert client.get("/export").status_code == 503
+
+
+def test_cap_is_released_after_a_streamed_response():
+    flask_app = Flask(__name__)
+    flask_app.config.update(SECRET_KEY="test", RATE_LIMIT_ENABLED=True,
+                            ENDPOINT_CLASSES={"export": "export"}, CONCURRENCY_LIMITS={"export": 1})
+    flask_app.add_url_rule("/export", "export", lambda: flask_app.response_class(iter([b"a", b"b"])))
+    AdmissionController(flask_app)
+    client = flask_app.test_client()
+
+    assert [client.get("/export").data for _ in range(3)] == [b"ab"] * 3
+
+
+def test_memory_store_evicts_least_recently_used_buckets():
+    store = MemoryRateLimitStore(max_keys=3)
+    for key in ("a", "b", "c"):
+        store.consume([(key, 1 / 60, 1)])
+    store.consume([("a", 1 / 60, 1)])  # Rejected, but still a use of "a"
+    store.consume([("d", 1 / 60, 1)])
+
+    assert list(store._buckets) == ["c", "a", "d"]
+    assert store.consume([("a", 1 / 60, 1)])[0] == 0  # "a" kept its empty bucket
@@ -0,0 +1,156 @@
+"""bulk_insert and count_where on every backend.
+
+SQLite always runs; Postgres runs when TEST_POSTGRES_URL points at a scratch
+database (needs psycopg2), e.g.
+    TEST_POSTGRES_URL=postgresql://localhost/hospital_test pytest tests/test_db_profiles.py
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from flask import Flask
+from sqlalchemy import Column, Integer, MetaData, String, Table, func, inspect, select, text
+
+import db_profiles
+from db_profiles import bulk_insert, count_where, init_backend_profile
+from models import db
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench"))
+from write_paths import run_bulk_insert  # noqa: E402
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+sample = Table(
+    "profile_sample", MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("label", String(100), nullable=True),
+    Column("amount", Integer, nullable=True),
+)
+
+
+def backend_url(backend):
+    if backend == "sqlite":
+        return "sqlite:///" + os.path.join(tempfile.mkdtemp(), "profiles.db")
+    if not POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    return POSTGRES_URL
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def backend_app(request):
+    """A bare app per backend with db_profiles applied and an empty sample table."""
+    flask_app = Flask(__name__)
+    flask_app.config.from_object("config")
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = backend_url(request.param)
+    init_backend_profile(flask_app)
+    with flask_app.app_context():
+        sample.drop(db.engine, checkfirst=True)
+        sample.create(db.engine)
+        yield flask_app
+        db.session.remove()
+        sample.drop(db.engine, checkfirst=True)
+        db.engine.dispose()
+
+
+ROWS = [
+    {"id": 1, "label": "plain", "amount": 10},
+    {"id": 2, "label": None, "amount": 20},
+    {"id": 3, "label": 'comma, "quote"\nnewline', "amount": None},
+    {"id": 4, "label": "", "amount": 0},
+]
+
+
+def test_bulk_insert_round_trips_nulls_and_csv_specials(backend_app, monkeypatch):
+    if db.engine.dialect.name == "postgresql":
+        # COPY must be used; the executemany fallback would hide a broken fast path
+        monkeypatch.setattr(db.session, "execute", lambda *a, **k: pytest.fail("executemany used"))
+    bulk_insert(sample, ROWS)
+    monkeypatch.undo()
+    db.session.commit()
+
+    stored = [dict(row._mapping) for row in db.session.execute(select(sample).order_by(sample.c.id))]
+    assert stored == ROWS
+
+
+def test_bulk_insert_rolls_back_with_the_session(backend_app):
+    bulk_insert(sample, ROWS)
+    db.session.rollback()
+    assert db.session.execute(select(func.count()).select_from(sample)).scalar() == 0
+
+
+def test_bulk_insert_ignores_empty_batch(backend_app):
+    bulk_insert(sample, [])
+    assert db.session.execute(select(func.count()).select_from(sample)).scalar() == 0
+
+
+@pytest.mark.parametrize("use_filter", [True, False])
+def test_count_where_next_to_other_aggregates(backend_app, monkeypatch, use_filter):
+    monkeypatch.setattr(db_profiles, "supports_aggregate_filter", lambda: use_filter)
+    bulk_insert(sample, ROWS)
+    db.session.commit()
+
+    total, large, unlabeled = db.session.execute(select(
+        func.count(),
+        count_where(sample.c.amount >= 10),
+        count_where(sample.c.label.is_(None)),
+    ).select_from(sample)).one()
+    assert (total, large, unlabeled) == (4, 2, 1)
+
+    # An empty match must count 0, not NULL, on the CASE fallback too
+    assert db.session.execute(
+        select(count_where(sample.c.amount > 1000)).select_from(sample)).scalar() == 0
+
+
+def test_statement_timeout_only_inside_requests(backend_app):
+    if db.engine.dialect.name != "postgresql":
+        pytest.skip("statement_timeout is Postgres-only")
+    assert db.session.execute(select(func.current_setting("statement_timeout"))).scalar() == "0"
+    db.session.rollback()
+    with backend_app.test_request_context("/"):
+        timeout = db.session.execute(select(func.current_setting("statement_timeout"))).scalar()
+        db.session.rollback()
+    assert timeout == f"{backend_app.config['PG_STATEMENT_TIMEOUT_MS'] // 1000}s"
+
+
+def test_hooks_attach_to_each_app_engine_once(backend_app):
+    engine = db.engine
+    connect_listeners = len(engine.pool.dispatch.connect)
+    after_begin_listeners = len(db.session().dispatch.after_begin)
+
+    other = Flask(__name__)
+    other.config.from_object("config")
+    other.config["SQLALCHEMY_DATABASE_URI"] = backend_url(engine.dialect.name)
+    init_backend_profile(other)
+    with other.app_context():
+        other_engine = db.engine
+        other_listeners = len(db.session().dispatch.after_begin)
+        db.session.remove()
+    other_engine.dispose()
+
+    assert other_engine is not engine
+    assert len(engine.pool.dispatch.connect) == connect_listeners
+    assert other_listeners == after_begin_listeners
+    if engine.dialect.name == "sqlite":
+        journal_mode = db.session.execute(text("PRAGMA journal_mode")).scalar()
+        assert journal_mode.lower() == backend_app.config["SQLITE_PRAGMAS"]["journal_mode"].lower()
+
+
+def test_bulk_insert_benchmark_runs(backend_app):
+    results = run_bulk_insert(5)
+    assert set(results) == {"row by row", "bulk_insert"}
+    assert all(rate > 0 for rate in results.values())
+
+
+def test_create_indexes_adds_indexes_to_existing_tables(app):
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_appointment_date_id")
+        conn.exec_driver_sql("DROP INDEX ix_medical_record_appointment_id")
+
+    runner = app.test_cli_runner()
+    for _ in range(2):  # Re-running must be harmless
+        assert runner.invoke(args=["create-indexes"]).exit_code == 0
+
+    inspector = inspect(db.engine)
+    assert "ix_appointment_date_id" in {ix["name"] for ix in inspector.get_indexes("appointment")}
+    assert "ix_medical_record_appointment_id" in {ix["name"] for ix in inspector.get_indexes("medical_record")}
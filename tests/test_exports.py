@@ -0,0 +1,117 @@
+import gzip
+import json
+from datetime import date, time
+
+import pytest
+
+import exports
+import services
+from models import Appointment, Doctor, MedicalRecord, Patient, db
+
+
+@pytest.fixture
+def records(app):
+    """Seed data plus shared doctors across patients and a patient without appointments."""
+    smith = Doctor.query.filter_by(name="Dr. Smith").first()
+    alice = Patient.query.filter_by(name="Alice").first()
+    bob = Patient.query.filter_by(name="Bob").first()
+    extra = [Appointment(patient_id=alice.id, doctor_id=smith.id, date=date(2026, 2, 1), time=time(9), status="Completed"),
+             Appointment(patient_id=bob.id, doctor_id=smith.id, date=date(2026, 2, 2), time=None, status="Pending")]
+    db.session.add_all(extra)
+    db.session.flush()
+    db.session.add(MedicalRecord(appointment_id=extra[0].id, diagnosis="Flu", prescription="Rest"))
+    db.session.commit()
+    carol = services.register_patient("carol", "pw", "Carol", 25, "Female", None)
+    return {"alice": alice.id, "bob": bob.id, "carol": carol.id}
+
+
+def by_type(resources, resource_type):
+    return [r for r in resources if r["resourceType"] == resource_type]
+
+
+def test_resources_are_grouped_by_patient_in_order(records):
+    resources = list(exports.iter_resources())
+
+    patient_ids = [int(r["id"]) for r in by_type(resources, "Patient")]
+    assert patient_ids == sorted(patient_ids)
+    assert records["carol"] in patient_ids  # No appointments, still exported
+
+    current_patient, emitted_doctors, encounters = None, set(), set()
+    for resource in resources:
+        kind = resource["resourceType"]
+        if kind == "Patient":
+            current_patient = f"Patient/{resource['id']}"
+        elif kind == "Practitioner":
+            assert resource["id"] not in emitted_doctors  # Each practitioner once
+            emitted_doctors.add(resource["id"])
+        elif kind == "Encounter":
+            assert resource["subject"]["reference"] == current_patient
+            doctor_ref = resource["participant"][0]["individual"]["reference"]
+            assert doctor_ref.split("/")[1] in emitted_doctors  # Practitioner comes first
+            encounters.add(f"Encounter/{resource['id']}")
+        else:
+            assert resource["subject"]["reference"] == current_patient
+            assert resource["encounter"]["reference"] in encounters
+    assert len(by_type(resources, "Encounter")) == Appointment.query.count()
+    assert len(by_type(resources, "Condition")) == MedicalRecord.query.count()
+
+
+def test_patient_id_range_is_inclusive(records):
+    bob, carol = records["bob"], records["carol"]
+    only_bob = list(exports.iter_resources(bob, bob))
+    assert [r["id"] for r in by_type(only_bob, "Patient")] == [str(bob)]
+    assert all(r["subject"]["reference"] == f"Patient/{bob}"
+               for r in only_bob if r["resourceType"] not in ("Patient", "Practitioner"))
+
+    from_bob = [int(r["id"]) for r in by_type(exports.iter_resources(start_id=bob), "Patient")]
+    assert from_bob == [bob, carol]
+    until_bob = [int(r["id"]) for r in by_type(exports.iter_resources(end_id=bob), "Patient")]
+    assert until_bob == [records["alice"], bob]
+
+
+def test_gzip_stream_decompresses_to_plain_ndjson(records, monkeypatch):
+    monkeypatch.setattr(exports, "CHUNK_SIZE", 256)  # Force several chunks
+    resources = list(exports.iter_resources())
+    plain_chunks = list(exports.iter_ndjson(resources))
+    gzip_chunks = list(exports.iter_ndjson(resources, compress=True))
+
+    assert len(plain_chunks) > 1
+    plain = b"".join(plain_chunks)
+    assert gzip.decompress(b"".join(gzip_chunks)) == plain
+    assert [json.loads(line) for line in plain.splitlines()] == resources
+
+
+def login(app, username, password):
+    client = app.test_client()
+    client.post("/", data={"username": username, "password": password})
+    return client
+
+
+def exported_patients(response):
+    lines = [json.loads(line) for line in response.data.splitlines()]
+    return {int(r["id"]) for r in lines if r["resourceType"] == "Patient"}
+
+
+def test_export_routes_and_access(app, records):
+    admin = login(app, "admin", "admin123")
+    response = admin.get("/admin/export")
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"] == "attachment; filename=patients.ndjson"
+    assert exported_patients(response) == set(records.values())
+
+    response = admin.get("/admin/export?start_id=%d&end_id=%d&compress=gzip" % (records["bob"], records["bob"]))
+    assert response.mimetype == "application/gzip"
+    assert {int(json.loads(line)["id"]) for line in gzip.decompress(response.data).splitlines()
+            if json.loads(line)["resourceType"] == "Patient"} == {records["bob"]}
+
+    assert exported_patients(admin.get(f"/admin/patient/{records['carol']}/export")) == {records["carol"]}
+
+    alice = login(app, "alice", "123")
+    assert exported_patients(alice.get("/patient/records/export")) == {records["alice"]}
+    assert alice.get("/admin/export").status_code == 403
+    assert alice.get(f"/admin/patient/{records['bob']}/export").status_code == 403
+
+    doctor = login(app, "dr_smith", "123")
+    assert doctor.get("/admin/export").status_code == 403
+    assert doctor.get("/patient/records/export").status_code == 403
+    assert app.test_client().get("/admin/export").status_code == 403
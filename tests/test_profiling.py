@@ -0,0 +1,89 @@
+import pstats
+import time
+
+from flask import Flask
+
+import app as hospital_app
+from profiling import RequestProfiler
+
+
+def profiled_app(**config):
+    flask_app = Flask(__name__)
+    flask_app.config.update({"SECRET_KEY": "test", "PROFILER_ENABLED": True, "PROFILER_SLOW_MS": None,
+                             "PROFILER_SAMPLE_INTERVAL_MS": 5, **config})
+    flask_app.add_url_rule("/fast", "fast", lambda: "ok")
+    flask_app.add_url_rule("/slow", "slow", lambda: time.sleep(0.1) or "ok")
+    flask_app.add_url_rule("/admin/profiles", "admin_profiles", lambda: "list")
+    profiler = RequestProfiler(flask_app)
+    return flask_app, profiler
+
+
+def client_as(flask_app, role):
+    client = flask_app.test_client()
+    if role:
+        with client.session_transaction() as sess:
+            sess["role"] = role
+    return client
+
+
+def test_header_profiles_admins_only():
+    flask_app, profiler = profiled_app()
+    client_as(flask_app, "patient").get("/fast", headers={"X-Profile": "1"})
+    client_as(flask_app, None).get("/fast", headers={"X-Profile": "1"})
+    assert not profiler.profiles
+
+    client_as(flask_app, "admin").get("/fast", headers={"X-Profile": "1"})
+    assert [(p["trigger"], p["format"], p["endpoint"]) for p in profiler.profiles] == [("header", "prof", "fast")]
+
+
+def test_token_replaces_the_admin_check():
+    flask_app, profiler = profiled_app(PROFILER_TOKEN="s3cret")
+    client_as(flask_app, "admin").get("/fast", headers={"X-Profile": "1"})
+    assert not profiler.profiles
+    client_as(flask_app, None).get("/fast", headers={"X-Profile": "s3cret"})
+    assert [p["trigger"] for p in profiler.profiles] == ["header"]
+
+
+def test_sampled_requests():
+    flask_app, profiler = profiled_app(PROFILER_SAMPLE_RATE=1.0)
+    flask_app.test_client().get("/fast")
+    assert [p["trigger"] for p in profiler.profiles] == ["sample"]
+
+
+def test_slow_requests_keep_folded_stacks():
+    flask_app, profiler = profiled_app(PROFILER_SLOW_MS=50)
+    client = flask_app.test_client()
+    client.get("/fast")
+    client.get("/slow")
+
+    [profile] = profiler.profiles
+    assert (profile["trigger"], profile["format"], profile["endpoint"]) == ("slow", "folded", "slow")
+    assert profile["duration_ms"] >= 50
+    assert "<lambda> (test_profiling.py" in profile["report"]
+
+
+def test_ring_buffer_keeps_newest_and_skips_profile_pages():
+    flask_app, profiler = profiled_app(PROFILER_RING_SIZE=3)
+    client = client_as(flask_app, "admin")
+    for i in range(5):
+        client.get(f"/fast?n={i}", headers={"X-Profile": "1"})
+    client.get("/admin/profiles", headers={"X-Profile": "1"})
+
+    assert [p["path"] for p in profiler.profiles] == ["/fast?n=4", "/fast?n=3", "/fast?n=2"]
+
+
+def test_prof_download_loads_with_pstats(app, tmp_path, monkeypatch):
+    flask_app, profiler = profiled_app()
+    client_as(flask_app, "admin").get("/fast", headers={"X-Profile": "1"})
+    monkeypatch.setattr(hospital_app.profiler, "profiles", profiler.profiles)
+    profile_id = profiler.profiles[0]["id"]
+
+    admin = app.test_client()
+    admin.post("/", data={"username": "admin", "password": "admin123"})
+    response = admin.get(f"/admin/profiles/{profile_id}/download")
+    assert response.headers["Content-Disposition"] == f"attachment; filename=profile-{profile_id}.prof"
+    path = tmp_path / "profile.prof"
+    path.write_bytes(response.data)
+
+    stats = pstats.Stats(str(path))
+    assert stats.total_calls > 0
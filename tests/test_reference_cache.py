@@ -0,0 +1,27 @@
+from models import Doctor, db
+from reference_cache import doctor_cache
+
+
+def test_invalidation_waits_for_commit(app):
+    doctor = Doctor.query.filter_by(name="Dr. Smith").first()
+    assert doctor_cache.get(doctor.id).name == "Dr. Smith"
+
+    doctor.name = "Dr. Smithers"
+    db.session.flush()
+    # Flushed but not committed: the cached committed value is still served
+    assert doctor.id in doctor_cache._entries
+
+    db.session.commit()
+    assert doctor_cache.get(doctor.id).name == "Dr. Smithers"
+
+
+def test_rollback_keeps_cache(app):
+    doctor = Doctor.query.filter_by(name="Dr. Jones").first()
+    doctor_cache.get(doctor.id)
+
+    doctor.name = "Dr. Nobody"
+    db.session.flush()
+    db.session.rollback()
+
+    assert doctor.id in doctor_cache._entries
+    assert doctor_cache.get(doctor.id).name == "Dr. Jones"
@@ -0,0 +1,84 @@
+import json
+from datetime import date, time, timedelta
+
+import pytest
+
+import reminders
+from models import Appointment, Patient, ReminderSent, db
+from reminders import FileTransport
+
+DAY = date.today() + timedelta(days=100)  # Clear of the seeded appointments
+
+
+class FailingTransport(FileTransport):
+    """Fails every batch containing one of `fail_ids` (module level so workers can unpickle it)."""
+
+    def __init__(self, path, fail_ids):
+        super().__init__(path)
+        self.fail_ids = set(fail_ids)
+
+    def send_many(self, messages):
+        if any(m["appointment_id"] in self.fail_ids for m in messages):
+            raise ConnectionError("gateway down")
+        return super().send_many(messages)
+
+
+@pytest.fixture
+def due(app):
+    """Five pending appointments in the window, plus rows that must never be reminded."""
+    alice = Patient.query.filter_by(name="Alice").first()
+    bob = Patient.query.filter_by(name="Bob").first()
+    ids = []
+    for i in range(5):
+        appointment = Appointment(patient_id=alice.id, doctor_id=1, date=DAY + timedelta(days=i % 2),
+                                  time=time(9 + i), status="Pending")
+        db.session.add(appointment)
+        db.session.flush()
+        ids.append(appointment.id)
+    db.session.add_all([
+        Appointment(patient_id=bob.id, doctor_id=1, date=DAY, time=time(9), status="Completed"),
+        Appointment(patient_id=bob.id, doctor_id=1, date=DAY + timedelta(days=5), time=time(9), status="Pending"),
+    ])
+    db.session.commit()
+    return ids
+
+
+def sent_lines(path):
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_keyset_pages_cover_the_window_once_in_order(due):
+    batches = list(reminders.iter_due_reminders(DAY, DAY + timedelta(days=1), batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    ids = [m["appointment_id"] for batch in batches for m in batch]
+    expected = [a.id for a in Appointment.query.filter(Appointment.id.in_(due))
+                .order_by(Appointment.date, Appointment.id)]
+    assert ids == expected
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_second_run_sends_nothing(due, tmp_path, workers):
+    path = tmp_path / "reminders.ndjson"
+    transport = FileTransport(str(path))
+
+    assert reminders.send_reminders(transport, start=DAY, batch_size=2, workers=workers) == 5
+    assert reminders.send_reminders(transport, start=DAY, batch_size=2, workers=workers) == 0
+
+    assert sorted(m["appointment_id"] for m in sent_lines(path)) == sorted(due)
+    assert sorted(r.appointment_id for r in ReminderSent.query) == sorted(due)
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_failed_batches_stay_unmarked(due, tmp_path, workers):
+    path = tmp_path / "reminders.ndjson"
+    failing = FailingTransport(str(path), fail_ids=[due[0]])
+
+    delivered = reminders.send_reminders(failing, start=DAY, batch_size=1, workers=workers)
+
+    assert delivered == 4
+    assert due[0] not in {r.appointment_id for r in ReminderSent.query}
+    # The next run retries only the failed appointment
+    assert reminders.send_reminders(FileTransport(str(path)), start=DAY, batch_size=1, workers=workers) == 1
+    assert sorted(m["appointment_id"] for m in sent_lines(path)) == sorted(due)
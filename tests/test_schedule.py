@@ -0,0 +1,105 @@
+from datetime import date, time, timedelta
+
+import pytest
+
+import schedule
+from models import Appointment, Doctor, MedicalRecord, Patient, db
+
+MONDAY = date(2030, 3, 4)
+
+
+@pytest.fixture
+def booked(app):
+    """Dr. Smith: two patients at 09:00 on Monday, one at 10:00 with a record, one on Wednesday."""
+    smith = Doctor.query.filter_by(name="Dr. Smith").first()
+    jones = Doctor.query.filter_by(name="Dr. Jones").first()
+    alice = Patient.query.filter_by(name="Alice").first()
+    bob = Patient.query.filter_by(name="Bob").first()
+    rows = [
+        Appointment(patient_id=bob.id, doctor_id=smith.id, date=MONDAY, time=time(9), status="Pending"),
+        Appointment(patient_id=alice.id, doctor_id=smith.id, date=MONDAY, time=time(9), status="Pending"),
+        Appointment(patient_id=alice.id, doctor_id=smith.id, date=MONDAY, time=time(10), status="Completed"),
+        Appointment(patient_id=bob.id, doctor_id=smith.id, date=MONDAY + timedelta(days=2), time=time(8), status="Pending"),
+        Appointment(patient_id=bob.id, doctor_id=jones.id, date=MONDAY, time=time(9), status="Pending"),
+        Appointment(patient_id=bob.id, doctor_id=smith.id, date=MONDAY + timedelta(days=7), time=time(9), status="Pending"),
+    ]
+    db.session.add_all(rows)
+    db.session.flush()
+    record = MedicalRecord(appointment_id=rows[2].id, diagnosis="Cough", prescription="Tea")
+    db.session.add(record)
+    db.session.commit()
+    return smith.id, rows, record.id
+
+
+def test_week_bounds():
+    assert schedule.week_bounds(MONDAY) == (MONDAY, MONDAY + timedelta(days=6))
+    assert schedule.week_bounds(MONDAY + timedelta(days=6)) == (MONDAY, MONDAY + timedelta(days=6))
+    assert schedule.week_bounds(MONDAY - timedelta(days=1))[0] == MONDAY - timedelta(days=7)
+
+
+def test_build_schedule_groups_by_day_and_slot(booked):
+    smith_id, rows, record_id = booked
+    days = schedule.build_schedule(smith_id, MONDAY, MONDAY + timedelta(days=6))
+
+    assert [day["date"] for day in days] == [MONDAY + timedelta(days=i) for i in range(7)]
+    assert [len(day["slots"]) for day in days] == [2, 0, 1, 0, 0, 0, 0]  # Empty days included
+    nine, ten = days[0]["slots"]
+    assert nine["time"] == time(9)
+    assert [a["id"] for a in nine["appointments"]] == [rows[0].id, rows[1].id]
+    assert [a["patient_name"] for a in nine["appointments"]] == ["Bob", "Alice"]
+    assert ten["appointments"][0]["record_id"] == record_id
+    assert nine["appointments"][0]["record_id"] is None
+
+
+def login_doctor(app):
+    client = app.test_client()
+    client.post("/", data={"username": "dr_smith", "password": "123"})
+    return client
+
+
+def test_schedule_json_shape(app, booked):
+    smith_id, rows, record_id = booked
+    client = login_doctor(app)
+    response = client.get(f"/doctor/schedule.json?start={(MONDAY + timedelta(days=3)).isoformat()}")
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert (data["doctor_id"], data["start"], data["end"]) == (smith_id, "2030-03-04", "2030-03-10")
+    assert len(data["days"]) == 7
+    assert data["days"][0] == {
+        "date": "2030-03-04",
+        "slots": [
+            {"time": "09:00", "appointments": [
+                {"id": rows[0].id, "status": "Pending", "patient_id": rows[0].patient_id,
+                 "patient_name": "Bob", "record_id": None},
+                {"id": rows[1].id, "status": "Pending", "patient_id": rows[1].patient_id,
+                 "patient_name": "Alice", "record_id": None}]},
+            {"time": "10:00", "appointments": [
+                {"id": rows[2].id, "status": "Completed", "patient_id": rows[2].patient_id,
+                 "patient_name": "Alice", "record_id": record_id}]},
+        ],
+    }
+    assert data["days"][1] == {"date": "2030-03-05", "slots": []}
+
+    today = client.get("/doctor/schedule.json?view=today&start=2030-03-06").get_json()
+    assert [day["date"] for day in today["days"]] == ["2030-03-06"]
+
+
+@pytest.mark.parametrize("query", [
+    "start=2030-13-01",
+    "start=2030-03-04&end=not-a-date",
+    "start=2030-03-04&end=2030-04-04",  # 32 days, one over the limit
+    "start=2030-03-04&end=2030-03-03",
+])
+def test_schedule_rejects_bad_ranges(app, query):
+    client = login_doctor(app)
+    assert client.get(f"/doctor/schedule.json?{query}").status_code == 400
+    assert client.get(f"/doctor/schedule?{query}").status_code == 400
+
+
+def test_schedule_page_renders(app, booked):
+    client = login_doctor(app)
+    assert client.get("/doctor/schedule.json?start=2030-03-04&end=2030-04-03").status_code == 200  # 31 days
+    response = client.get("/doctor/schedule?start=2030-03-04")
+    assert response.status_code == 200
+    assert b"Alice" in response.data and b"Bob" in response.data
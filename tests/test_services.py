@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+import services
+from models import AuditLog, Doctor, Patient, User, db
+
+
+def test_failed_profile_insert_leaves_no_user(app):
+    admin = User.query.filter_by(username="admin").first()
+    with pytest.raises(IntegrityError):
+        services.add_doctor("dr_broken", "pw", None, "Cardiology", "0", actor=admin)  # name is NOT NULL
+    with pytest.raises(IntegrityError):
+        services.register_patient("broken", "pw", None, 30, "Female", "0")
+
+    assert User.query.filter(User.username.in_(["dr_broken", "broken"])).count() == 0
+    assert AuditLog.query.filter(AuditLog.action.like("%broken%")).count() == 0
+
+
+class PgSerializationError(Exception):
+    pgcode = "40001"
+
+
+@pytest.mark.parametrize("orig", [sqlite3.OperationalError("database is locked"), PgSerializationError()])
+def test_retryable_commit_failure_is_retried_once(app, monkeypatch, orig):
+    session = db.session()
+    real_commit = session.commit
+    calls = []
+
+    def flaky_commit():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OperationalError("COMMIT", {}, orig)
+        real_commit()
+
+    monkeypatch.setattr(session, "commit", flaky_commit)
+    monkeypatch.setattr(services._time, "sleep", lambda seconds: None)
+
+    doctor = services.add_doctor("dr_retry", "pw", "Dr. Retry", "Cardiology", "0")
+
+    assert len(calls) == 2
+    assert User.query.filter_by(username="dr_retry").count() == 1
+    assert Doctor.query.filter_by(name="Dr. Retry").one().id == doctor.id
+
+
+def test_other_errors_are_not_retried(app, monkeypatch):
+    calls = []
+
+    def failing_commit():
+        calls.append(1)
+        raise OperationalError("COMMIT", {}, sqlite3.OperationalError("disk I/O error"))
+
+    monkeypatch.setattr(db.session(), "commit", failing_commit)
+    with pytest.raises(OperationalError):
+        services.register_patient("no_retry", "pw", "No Retry", 30, "Male", "0")
+
+    assert len(calls) == 1
+    monkeypatch.undo()
+    assert Patient.query.filter_by(name="No Retry").count() == 0
@@ -0,0 +1,138 @@
+import time
+
+from sqlalchemy import event
+
+import services
+from models import User, UserSession, db
+from sessions import RedisSessionStore, ServerSideSessionInterface, SqlSessionStore
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the redis-py calls RedisSessionStore uses."""
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+        self.ttls[key] = ex
+
+    def delete(self, key):
+        self.values.pop(key, None)
+        self.ttls.pop(key, None)
+
+    def sadd(self, key, member):
+        self.values.setdefault(key, set()).add(member)
+
+    def smembers(self, key):
+        return self.values.get(key, set())
+
+    def expire(self, key, ttl):
+        self.ttls[key] = ttl
+
+
+def test_redis_touch_extends_user_index():
+    client = FakeRedis()
+    store = RedisSessionStore(client)
+    now = time.time()
+    store.set("abc", '{"user_id": 7}', 7, now + 60)
+
+    store.touch("abc", now + 7200)
+
+    assert client.ttls["session:abc"] >= 7199
+    assert client.ttls["session:user:7"] >= 7199
+    assert store.get("abc")[0] == '{"user_id": 7}'
+    assert store.delete_for_user(7) == 1
+    assert store.get("abc") is None
+
+
+def test_redis_anonymous_session_round_trip():
+    store = RedisSessionStore(FakeRedis())
+    store.set("anon", "a|b", None, time.time() + 60)
+    assert store.get("anon")[0] == "a|b"
+
+
+def session_id(client, app):
+    cookie = client.get_cookie(app.config["SESSION_COOKIE_NAME"])
+    return cookie.value if cookie else None
+
+
+def login(client, username, password):
+    return client.post("/", data={"username": username, "password": password})
+
+
+def test_login_regenerates_session_id(app):
+    store = app.session_interface.store
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["visited"] = True  # A pre-login session, e.g. one planted by an attacker
+    before = session_id(client, app)
+    assert before and store.get(before) is not None
+
+    login(client, "alice", "123")
+    after = session_id(client, app)
+    assert after != before
+    assert store.get(before) is None
+    with client.session_transaction() as sess:
+        assert sess["display_name"] == "Alice" and sess["profile_id"]
+
+
+def test_deleting_an_account_revokes_its_sessions(app):
+    admin_user = User.query.filter_by(username="admin").first()
+    doctor = services.add_doctor("dr_leaving", "pw", "Dr. Leaving", "Surgery", "0", actor=admin_user)
+    patient = services.register_patient("leaving", "pw", "Leaving", 50, "Male", "0")
+    accounts = (
+        ("dr_leaving", "/doctor/appointments", f"/admin/doctor/delete/{doctor.id}"),
+        ("leaving", "/patient/appointments", f"/admin/patient/delete/{patient.id}"),
+    )
+    admin = app.test_client()
+    login(admin, "admin", "admin123")
+
+    for username, landing, delete_url in accounts:
+        client = app.test_client()
+        login(client, username, "pw")
+        assert client.get(landing).status_code == 200
+        sid = session_id(client, app)
+
+        admin.get(delete_url)
+
+        assert app.session_interface.store.get(sid) is None
+        assert client.get(landing).status_code == 403
+
+
+def test_sweeper_removes_expired_sessions_once_per_interval(app):
+    store = SqlSessionStore()
+    interface = ServerSideSessionInterface(store, sweep_interval=300)
+    now = time.time()
+    store.set("expired", "{}", None, now - 1)
+    store.set("live", "{}", None, now + 600)
+
+    interface._maybe_sweep(now)
+    assert {row.sid for row in UserSession.query} == {"live"}
+
+    store.set("expired-later", "{}", None, now - 1)
+    interface._maybe_sweep(now + 10)  # Within the interval: no sweep
+    assert db.session.get(UserSession, "expired-later") is not None
+    db.session.rollback()
+    interface._maybe_sweep(now + 301)
+    assert db.session.get(UserSession, "expired-later") is None
+
+
+def test_patient_pages_skip_the_profile_lookup(app):
+    client = app.test_client()
+    login(client, "alice", "123")
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        assert client.get("/patient/records").status_code == 200
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    assert not [s for s in statements if "FROM patient" in s and "WHERE patient.id" in s]
@@ -0,0 +1,81 @@
+from datetime import date, time, timedelta
+
+import services
+import waitlist
+from models import Appointment, Doctor, FreedSlot, Patient, User, WaitlistEntry, db
+
+SOON = date.today() + timedelta(days=7)
+LATER = date.today() + timedelta(days=30)
+
+
+def login(client, username, password):
+    client.post("/", data={"username": username, "password": password})
+
+
+def appointment_for(name, doctor_id, day, status="Pending", at=time(9)):
+    patient = Patient.query.filter_by(name=name).first()
+    appointment = Appointment(patient_id=patient.id, doctor_id=doctor_id, date=day, time=at, status=status)
+    db.session.add(appointment)
+    db.session.commit()
+    return appointment
+
+
+def test_join_rejects_past_and_non_pending_appointments(app):
+    past = appointment_for("Alice", 1, date.today() - timedelta(days=1))
+    completed = appointment_for("Alice", 1, LATER, status="Completed")
+    upcoming = appointment_for("Alice", 1, LATER, at=time(10))
+
+    assert waitlist.join_waitlist(past) is None
+    assert waitlist.join_waitlist(completed) is None
+    assert waitlist.join_waitlist(upcoming).status == "Waiting"
+
+
+def test_stale_offer_returns_to_waitlist(app):
+    bob = appointment_for("Bob", 1, LATER)
+    entry = waitlist.join_waitlist(bob)
+    yesterday = date.today() - timedelta(days=1)
+    stale = FreedSlot(doctor_id=1, date=yesterday, time=time(9), status="Offered", offered_entry_id=entry.id)
+    entry.status = "Offered"
+    db.session.add(stale)
+    db.session.commit()
+
+    # The next freed slot expires the unanswered offer and reaches Bob again
+    alice = appointment_for("Alice", 1, SOON)
+    waitlist.cancel_appointment(alice)
+
+    assert stale.status == "Unclaimed" and stale.offered_entry_id is None
+    offers = waitlist.open_offers(bob.patient_id)
+    assert [(slot.date, slot.offered_entry_id) for slot in offers] == [(SOON, entry.id)]
+    assert db.session.get(WaitlistEntry, entry.id).status == "Offered"
+
+
+def test_claim_refuses_slot_booked_meanwhile(app):
+    bob = appointment_for("Bob", 1, LATER)
+    entry = waitlist.join_waitlist(bob)
+    alice = appointment_for("Alice", 1, SOON)
+    waitlist.cancel_appointment(alice)
+    slot = FreedSlot.query.filter_by(offered_entry_id=entry.id).one()
+
+    # Someone books the freed slot directly before Bob answers the offer
+    services.book_appointment(Patient.query.filter_by(name="Alice").first(), 1, SOON, time(9))
+
+    assert waitlist.claim_offer(slot.id, Patient.query.filter_by(name="Bob").first()) is None
+    assert db.session.get(Appointment, bob.id).date == LATER
+    assert slot.status == "Unclaimed"
+    assert db.session.get(WaitlistEntry, entry.id).status == "Waiting"
+
+
+def test_delete_doctor_removes_freed_slots(app):
+    admin = User.query.filter_by(username="admin").first()
+    doctor = services.add_doctor("dr_gone", "x", "Dr. Gone", "Dermatology", "0", actor=admin)
+    db.session.add(FreedSlot(doctor_id=doctor.id, date=date.today() + timedelta(days=3),
+                             time=time(9), status="Unclaimed"))
+    db.session.commit()
+    doctor_id = doctor.id
+
+    client = app.test_client()
+    login(client, "admin", "admin123")
+    client.get(f"/admin/doctor/delete/{doctor_id}")
+
+    assert db.session.get(Doctor, doctor_id) is None
+    assert FreedSlot.query.filter_by(doctor_id=doctor_id).count() == 0
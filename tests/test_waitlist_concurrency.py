@@ -0,0 +1,98 @@
+"""Concurrent cancellations and claims against the file-backed SQLite test database."""
+import threading
+from datetime import date, time, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
+import services
+import waitlist
+from models import Appointment, FreedSlot, Patient, WaitlistEntry, db
+
+SLOTS = 12
+DOCTOR_ID = 2
+
+
+def run_threads(targets):
+    threads = [threading.Thread(target=target, args=args) for target, args in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    assert not any(thread.is_alive() for thread in threads)
+
+
+def test_each_freed_slot_is_claimed_exactly_once(app):
+    soon = date.today() + timedelta(days=5)
+    later = date.today() + timedelta(days=60)
+    cancel_ids, waiting_patient_ids = [], []
+    for i in range(2 * SLOTS):
+        patient = services.register_patient(f"stress{i}", "x", f"Stress {i}", 30, "Female", "0")
+        if i < SLOTS:
+            appointment = Appointment(patient_id=patient.id, doctor_id=DOCTOR_ID, date=soon,
+                                      time=time(8 + i % 8, 30 * (i // 8)), status="Pending")
+            db.session.add(appointment)
+            db.session.flush()
+            cancel_ids.append(appointment.id)
+        else:
+            appointment = Appointment(patient_id=patient.id, doctor_id=DOCTOR_ID, date=later,
+                                      time=time(9), status="Pending")
+            db.session.add(appointment)
+            db.session.flush()
+            db.session.add(WaitlistEntry(doctor_id=DOCTOR_ID, patient_id=patient.id,
+                                         appointment_id=appointment.id, before_date=later,
+                                         priority=i % 3, status="Waiting"))
+            waiting_patient_ids.append(patient.id)
+    db.session.commit()
+
+    errors = []
+    cancels_done = threading.Event()
+    remaining = [len(cancel_ids)]
+    lock = threading.Lock()
+
+    def cancel(appointment_id):
+        with app.app_context():
+            try:
+                waitlist.cancel_appointment(db.session.get(Appointment, appointment_id))
+            except Exception as e:
+                errors.append(repr(e))
+            finally:
+                with lock:
+                    remaining[0] -= 1
+                    if not remaining[0]:
+                        cancels_done.set()
+
+    def claim(patient_id):
+        # Every claimer races for every open offer, including other patients' offers
+        with app.app_context():
+            patient = db.session.get(Patient, patient_id)
+            while True:
+                finished = cancels_done.is_set()
+                try:
+                    offered = [slot_id for (slot_id,) in db.session.query(FreedSlot.id).filter_by(status="Offered")]
+                    db.session.rollback()
+                    for slot_id in offered:
+                        waitlist.claim_offer(slot_id, patient)
+                except OperationalError:
+                    db.session.rollback()  # Lock contention beyond transactional's retries; try again
+                except Exception as e:
+                    errors.append(repr(e))
+                    return
+                if finished and not offered:
+                    return
+
+    run_threads([(cancel, (appointment_id,)) for appointment_id in cancel_ids]
+                + [(claim, (patient_id,)) for patient_id in waiting_patient_ids])
+
+    assert errors == []
+    slots = FreedSlot.query.filter_by(doctor_id=DOCTOR_ID, date=soon).all()
+    assert len(slots) == SLOTS
+    assert all(slot.status == "Claimed" for slot in slots)
+    # Exactly one appointment per freed slot, owned by the patient whose entry claimed it
+    for slot in slots:
+        holders = Appointment.query.filter_by(doctor_id=DOCTOR_ID, date=slot.date, time=slot.time).all()
+        assert len(holders) == 1
+        assert holders[0].patient_id == slot.offered_entry.patient_id
+    claimed_entries = WaitlistEntry.query.filter_by(doctor_id=DOCTOR_ID, status="Claimed").count()
+    assert claimed_entries == SLOTS
+    assert db.session.query(func.count(Appointment.id)).filter_by(doctor_id=DOCTOR_ID, date=later).scalar() == 0
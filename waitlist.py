@@ -0,0 +1,241 @@
+from datetime import date
+
+from models import Appointment, FreedSlot, WaitlistEntry, db
+from services import lock_doctor_schedule, log_action, transactional
+
+
+# ===========================
+# Matching
+# ===========================
+def expire_stale_offers(doctor_id):
+    """Returns offers whose slot date has passed to the waitlist. Flushes only.
+
+    A patient who never answered keeps their place (the entry goes back to
+    Waiting) and the slot is marked Unclaimed. Runs lazily before each new
+    offer for the doctor, which is the only time a stale offer matters."""
+    stale = (db.session.query(FreedSlot.id, FreedSlot.offered_entry_id)
+             .filter(FreedSlot.doctor_id == doctor_id,
+                     FreedSlot.status == "Offered",
+                     FreedSlot.date < date.today())
+             .all())
+    if not stale:
+        return
+    FreedSlot.query.filter(FreedSlot.id.in_([slot_id for slot_id, _ in stale]),
+                           FreedSlot.status == "Offered").update(
+        {"status": "Unclaimed", "offered_entry_id": None}, synchronize_session=False)
+    WaitlistEntry.query.filter(WaitlistEntry.id.in_([entry_id for _, entry_id in stale if entry_id]),
+                               WaitlistEntry.status == "Offered").update(
+        {"status": "Waiting"}, synchronize_session=False)
+
+
+def _reserve_next_entry(doctor_id, slot_date, exclude_entry_id=None):
+    """Moves the highest-priority waiting entry for a slot from Waiting to Offered.
+
+    The candidate comes from one lookup on ix_waitlist_match. The conditional
+    UPDATE makes the reservation atomic: if a concurrent transaction reserved
+    the same entry first, zero rows match and the next candidate is tried.
+
+    Args:
+        doctor_id (int): Doctor whose slot was freed.
+        slot_date (date): Date of the freed slot; only entries wanting a slot before
+            their current appointment date qualify.
+        exclude_entry_id (int or None): Entry that must not be picked.
+
+    Returns:
+        WaitlistEntry or None"""
+    expire_stale_offers(doctor_id)
+    while True:
+        query = WaitlistEntry.query.filter(
+            WaitlistEntry.doctor_id == doctor_id,
+            WaitlistEntry.status == "Waiting",
+            WaitlistEntry.before_date > slot_date)
+        if exclude_entry_id is not None:
+            query = query.filter(WaitlistEntry.id != exclude_entry_id)
+        entry = query.order_by(WaitlistEntry.priority.desc(), WaitlistEntry.created_at).first()
+        if entry is None:
+            return None
+        reserved = WaitlistEntry.query.filter_by(id=entry.id, status="Waiting").update(
+            {"status": "Offered"}, synchronize_session=False)
+        if reserved:
+            db.session.refresh(entry)
+            return entry
+
+
+def release_slot(doctor_id, slot_date, slot_time):
+    """Offers a freed slot to the best waiting patient. Flushes only; the caller commits.
+
+    Returns:
+        FreedSlot or None: The offer, or None when nobody is waiting or the slot is past."""
+    if slot_date < date.today():
+        return None
+    entry = _reserve_next_entry(doctor_id, slot_date)
+    if entry is None:
+        return None
+    slot = FreedSlot(doctor_id=doctor_id, date=slot_date, time=slot_time,
+                     status="Offered", offered_entry_id=entry.id)
+    db.session.add(slot)
+    db.session.flush()
+    return slot
+
+
+def _pass_on(slot, exclude_entry_id):
+    """Re-offers a slot to the next waiting patient, or marks it Unclaimed."""
+    entry = _reserve_next_entry(slot.doctor_id, slot.date, exclude_entry_id)
+    slot.offered_entry_id = entry.id if entry else None
+    slot.status = "Offered" if entry else "Unclaimed"
+
+
+def leave_waitlist(appointment_id):
+    """Removes the waitlist entries of an appointment, passing on any open offer."""
+    entries = WaitlistEntry.query.filter_by(appointment_id=appointment_id).all()
+    for entry in entries:
+        if entry.status == "Offered":
+            for slot in FreedSlot.query.filter_by(offered_entry_id=entry.id, status="Offered"):
+                _pass_on(slot, exclude_entry_id=entry.id)
+        db.session.delete(entry)
+    db.session.flush()
+
+
+def forget_doctor(doctor_id):
+    """Deletes a doctor's freed slots and waitlist entries ahead of the doctor row. Flushes only.
+
+    The foreign keys cascade on Postgres, but SQLite does not enforce them,
+    so the rows are removed explicitly."""
+    FreedSlot.query.filter_by(doctor_id=doctor_id).delete(synchronize_session=False)
+    WaitlistEntry.query.filter_by(doctor_id=doctor_id).delete(synchronize_session=False)
+
+
+# ===========================
+# Business Operations
+# ===========================
+def join_waitlist(appointment, priority=0):
+    """Puts a patient on their doctor's waitlist for a slot earlier than `appointment`.
+
+    Returns:
+        WaitlistEntry or None: The new or already existing active entry, or None
+        if the appointment is not a pending one from today on."""
+    if appointment.status != "Pending" or appointment.date < date.today():
+        return None
+    existing = WaitlistEntry.query.filter(
+        WaitlistEntry.appointment_id == appointment.id,
+        WaitlistEntry.status.in_(("Waiting", "Offered"))).first()
+    if existing:
+        return existing
+    entry = WaitlistEntry(
+        doctor_id=appointment.doctor_id,
+        patient_id=appointment.patient_id,
+        appointment_id=appointment.id,
+        before_date=appointment.date,
+        priority=priority,
+        status="Waiting")
+    db.session.add(entry)
+    db.session.commit()
+    return entry
+
+
+@transactional()
+def cancel_appointment(appointment, actor=None):
+    """Deletes an appointment and offers its slot to the waitlist in one transaction."""
+    slot = (appointment.doctor_id, appointment.date, appointment.time)
+    leave_waitlist(appointment.id)
+    db.session.delete(appointment)
+    db.session.flush()
+    release_slot(*slot)
+    if actor is not None:
+        log_action(actor, f"Canceled appointment {appointment.id}", commit=False)
+
+
+@transactional()
+def reschedule_appointment(appointment, doctor_id, appt_date, appt_time, actor=None, patient_name=""):
+    """Moves an appointment; if its slot changed, the old slot goes to the waitlist."""
+    lock_doctor_schedule(doctor_id)
+    old_slot = (appointment.doctor_id, appointment.date, appointment.time)
+    appointment.doctor_id = doctor_id
+    appointment.date = appt_date
+    appointment.time = appt_time
+    if old_slot != (doctor_id, appt_date, appt_time):
+        leave_waitlist(appointment.id)  # The patient picked a new slot themselves
+        release_slot(*old_slot)
+    if actor is not None:
+        log_action(actor, f"Updated appointment {appointment.id} for patient {patient_name}", commit=False)
+
+
+@transactional()
+def claim_offer(slot_id, patient):
+    """Atomically claims an offered slot and moves the patient's appointment into it.
+
+    Only one claim can win: the slot flips from Offered to Claimed with a
+    conditional UPDATE, so a concurrent claim or re-offer sees zero rows.
+    If the slot was booked directly in the meantime (book_appointment and
+    reschedule_appointment take the same doctor lock), the offer is withdrawn
+    and the patient goes back to waiting. The patient's previous slot is then
+    released to the waitlist.
+
+    Returns:
+        Appointment or None: The moved appointment, or None if the offer is no longer valid."""
+    slot = db.session.get(FreedSlot, slot_id)
+    if slot is None or slot.offered_entry_id is None or slot.date < date.today():
+        return None
+    entry = db.session.get(WaitlistEntry, slot.offered_entry_id)
+    if entry is None or entry.patient_id != patient.id:
+        return None
+    lock_doctor_schedule(slot.doctor_id)
+    taken = (db.session.query(Appointment.id)
+             .filter(Appointment.doctor_id == slot.doctor_id,
+                     Appointment.date == slot.date,
+                     Appointment.time == slot.time,
+                     Appointment.id != entry.appointment_id)
+             .first())
+    if taken:
+        withdrawn = FreedSlot.query.filter_by(id=slot.id, status="Offered", offered_entry_id=entry.id).update(
+            {"status": "Unclaimed", "offered_entry_id": None}, synchronize_session=False)
+        if withdrawn:
+            entry.status = "Waiting"
+        return None
+    claimed = FreedSlot.query.filter_by(id=slot.id, status="Offered", offered_entry_id=entry.id).update(
+        {"status": "Claimed"}, synchronize_session=False)
+    if not claimed:
+        return None
+
+    appointment = db.session.get(Appointment, entry.appointment_id)
+    old_slot = (appointment.doctor_id, appointment.date, appointment.time)
+    appointment.date = slot.date
+    appointment.time = slot.time
+    entry.status = "Claimed"
+    db.session.flush()
+    release_slot(*old_slot)
+    log_action(patient.user, f"Claimed waitlist slot {slot.id} for appointment {appointment.id}", commit=False)
+    return appointment
+
+
+@transactional()
+def decline_offer(slot_id, patient):
+    """Declines an offer (leaving the waitlist) and passes the slot to the next patient.
+
+    Returns:
+        bool: True if the offer was declined."""
+    slot = db.session.get(FreedSlot, slot_id)
+    if slot is None or slot.offered_entry_id is None:
+        return False
+    entry = db.session.get(WaitlistEntry, slot.offered_entry_id)
+    if entry is None or entry.patient_id != patient.id:
+        return False
+    released = FreedSlot.query.filter_by(id=slot.id, status="Offered", offered_entry_id=entry.id).update(
+        {"status": "Unclaimed", "offered_entry_id": None}, synchronize_session=False)
+    if not released:
+        return False
+    entry.status = "Declined"
+    db.session.refresh(slot)
+    _pass_on(slot, exclude_entry_id=entry.id)
+    return True
+
+
+def open_offers(patient_id):
+    """Returns the slots currently offered to a patient, soonest first."""
+    return (FreedSlot.query
+            .join(WaitlistEntry, FreedSlot.offered_entry_id == WaitlistEntry.id)
+            .filter(WaitlistEntry.patient_id == patient_id,
+                    FreedSlot.status == "Offered",
+                    FreedSlot.date >= date.today())
+            .order_by(FreedSlot.date, FreedSlot.time)
+            .all())